@@ -0,0 +1,33 @@
+"""Measures chunking of heavily fragmented inline markup and the memory held by many chunks.
+
+    PYTHONPATH=. python benchmarks/chunk_accumulation.py [fragments per paragraph] [paragraphs]
+"""
+import sys
+import timeit
+import tracemalloc
+
+from docconv.htmlchunks import Chunk, ChunkHTMLParser, LXML_NATIVE_BACKEND
+
+
+def fragmented_document(fragments_per_paragraph, paragraphs):
+    paragraph = "<p>%s</p>" % "".join('<a href="#">word%d</a> <span>text</span>' % index
+                                      for index in range(fragments_per_paragraph))
+    return "<html><body>%s</body></html>" % (paragraph * paragraphs)
+
+
+def main(fragments_per_paragraph, paragraphs):
+    html = fragmented_document(fragments_per_paragraph, paragraphs)
+    parser = ChunkHTMLParser(parser_backend=LXML_NATIVE_BACKEND)
+    seconds = timeit.timeit(lambda: parser.parse(html), number=5) / 5
+    print(f"chunking {paragraphs} paragraphs of {fragments_per_paragraph * 2} fragments: {seconds * 1000:.1f} ms")
+
+    tracemalloc.start()
+    chunks = [Chunk("some chunk text %d" % index, Chunk.headline_type if index % 10 == 0 else None)
+              for index in range(100000)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"memory of {len(chunks)} chunks: {current / len(chunks):.0f} bytes per chunk")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else 200)
@@ -0,0 +1,42 @@
+"""Compares the memory held by the chunks of a batch of documents as Chunk lists and as ChunkSpans.
+
+    PYTHONPATH=. python benchmarks/chunk_spans_memory.py [copies of each fixture]
+"""
+import os
+import sys
+import tracemalloc
+
+from docconv.htmlchunks import ChunkHTMLParser, LXML_NATIVE_BACKEND
+
+RESOURCES_DIR = os.path.join(os.path.dirname(__file__), '..', 'docconv', 'tests', 'htmlchunks', 'resources')
+
+
+def measure(parse, documents):
+    tracemalloc.start()
+    results = [parse(document) for document in documents]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return results, current
+
+
+def main(copies):
+    documents = []
+    for resource in sorted(os.listdir(RESOURCES_DIR)):
+        with open(os.path.join(RESOURCES_DIR, resource)) as f:
+            documents.extend([f.read()] * copies)
+    parser = ChunkHTMLParser(parser_backend=LXML_NATIVE_BACKEND)
+
+    def parse_chunks(document):
+        parser.parse(document)
+        return parser.chunks
+
+    chunk_lists, chunks_memory = measure(parse_chunks, documents)
+    _, spans_memory = measure(parser.parse_spans, documents)
+    number_of_chunks = sum(len(chunks) for chunks in chunk_lists)
+    print(f"{number_of_chunks} chunks of {len(documents)} documents")
+    print(f"Chunk lists: {chunks_memory / 1024:.0f} KiB")
+    print(f"ChunkSpans:  {spans_memory / 1024:.0f} KiB")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,33 @@
+"""Measures the throughput of Html2TextChunksConverter.iter_batch_text_chunks for growing numbers of worker processes
+on copies of the htmlchunks test fixtures.
+
+    PYTHONPATH=. python benchmarks/html_batch_chunking.py [copies of each fixture] [chunksize] [parser backend]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+from docconv.htmlchunks import Html2TextChunksConverter, HTML_PARSER_BACKEND
+
+FIXTURES_DIR = Path(__file__).parent.parent / 'docconv' / 'tests' / 'htmlchunks' / 'resources'
+
+
+def main(copies, chunksize, parser_backend):
+    documents = [fixture.read_text() for fixture in sorted(FIXTURES_DIR.glob('*.html'))] * copies
+    worker_counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    print(f"{len(documents)} documents, chunksize {chunksize}, {parser_backend}")
+    print(f"{'workers':>8}{'docs/s':>10}{'speedup':>10}")
+    single_worker_rate = None
+    for workers in worker_counts:
+        started = time.perf_counter()
+        results = list(Html2TextChunksConverter.iter_batch_text_chunks(documents, workers=workers, chunksize=chunksize,
+                                                                       parser_backend=parser_backend))
+        rate = len(results) / (time.perf_counter() - started)
+        single_worker_rate = single_worker_rate or rate
+        print(f"{workers:>8}{rate:>10.1f}{rate / single_worker_rate:>10.2f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40, int(sys.argv[2]) if len(sys.argv) > 2 else 16,
+         sys.argv[3] if len(sys.argv) > 3 else HTML_PARSER_BACKEND)
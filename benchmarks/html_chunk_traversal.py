@@ -0,0 +1,34 @@
+"""Times ChunkHTMLParser on the htmlchunks test fixtures and on a synthetic deeply nested document.
+
+    PYTHONPATH=. python benchmarks/html_chunk_traversal.py [repetitions]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+from docconv.htmlchunks import ChunkHTMLParser
+
+FIXTURES_DIR = Path(__file__).parent.parent / 'docconv' / 'tests' / 'htmlchunks' / 'resources'
+SYNTHETIC_DEPTH = 10000
+
+
+def synthetic_deep_document(depth):
+    return "<html><body>%s%s</body></html>" % ("<div><span>level</span>" * depth, "</div>" * depth)
+
+
+def main(repetitions):
+    documents = [(fixture.name, fixture.read_text()) for fixture in sorted(FIXTURES_DIR.glob('*.html'))]
+    documents.append((f'synthetic depth {SYNTHETIC_DEPTH}', synthetic_deep_document(SYNTHETIC_DEPTH)))
+    parser = ChunkHTMLParser()
+    print(f"{'document':<30}{'ms/parse':>12}{'chunks':>10}")
+    for name, html in documents:
+        try:
+            seconds = timeit.timeit(lambda: parser.parse(html), number=repetitions)
+        except RecursionError:
+            print(f"{name:<30}{'RecursionError':>22}")
+            continue
+        print(f"{name:<30}{seconds / repetitions * 1000:>12.2f}{len(parser.chunks):>10}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
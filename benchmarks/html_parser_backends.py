@@ -0,0 +1,35 @@
+"""Compares the chunking throughput of the ChunkHTMLParser backends on the htmlchunks test fixtures.
+
+    PYTHONPATH=. python benchmarks/html_parser_backends.py [repetitions]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+from docconv.htmlchunks import Html2TextChunksConverter, HTML_PARSER_BACKEND, LXML_BACKEND, HTML5LIB_BACKEND, \
+    LXML_NATIVE_BACKEND
+
+FIXTURES_DIR = Path(__file__).parent.parent / 'docconv' / 'tests' / 'htmlchunks' / 'resources'
+BACKENDS = [HTML_PARSER_BACKEND, LXML_BACKEND, HTML5LIB_BACKEND, LXML_NATIVE_BACKEND]
+
+
+def main(repetitions):
+    documents = [fixture.read_text() for fixture in sorted(FIXTURES_DIR.glob('*.html'))]
+    megabytes = sum(len(document.encode()) for document in documents) / 1024 / 1024
+    expected_chunks = [Html2TextChunksConverter.to_text_chunks(document) for document in documents]
+    print(f"{'backend':<14}{'docs/s':>10}{'MB/s':>10}{'same chunks':>14}")
+    for backend in BACKENDS:
+        try:
+            chunks = [Html2TextChunksConverter.to_text_chunks(document, parser_backend=backend)
+                      for document in documents]
+        except Exception as ex:
+            print(f"{backend:<14}{'unavailable (%s)' % ex.__class__.__name__:>34}")
+            continue
+        seconds = timeit.timeit(lambda: [Html2TextChunksConverter.to_text_chunks(document, parser_backend=backend)
+                                         for document in documents], number=repetitions)
+        print(f"{backend:<14}{len(documents) * repetitions / seconds:>10.1f}{megabytes * repetitions / seconds:>10.2f}"
+              f"{str(chunks == expected_chunks):>14}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
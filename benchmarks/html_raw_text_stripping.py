@@ -0,0 +1,48 @@
+"""Compares parse times with and without cutting script, style and svg elements out of the markup before parsing, on
+the htmlchunks and htmlarticle test fixtures.
+
+    PYTHONPATH=. python benchmarks/html_raw_text_stripping.py [repetitions]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+from docconv.htmlarticle import HtmlArticleExtractor
+from docconv.htmlchunks import ChunkHTMLParser, HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND, strip_raw_text_elements
+
+TESTS_DIR = Path(__file__).parent.parent / 'docconv' / 'tests'
+SOURCE_URL = 'http://foo.de'
+
+
+def measure(name, documents, convert, repetitions):
+    seconds = timeit.timeit(lambda: [convert(document) for document in documents], number=repetitions) / repetitions
+    print(f"{name:<32}{seconds * 1000:>10.1f} ms")
+    return seconds
+
+
+def main(repetitions):
+    chunk_documents = [fixture.read_text()
+                       for fixture in sorted((TESTS_DIR / 'htmlchunks' / 'resources').glob('*.html'))]
+    article_documents = [fixture.read_text()
+                         for fixture in sorted((TESTS_DIR / 'htmlarticle' / 'resources').glob('*.html'))]
+    for name, documents in [('htmlchunks fixtures', chunk_documents), ('htmlarticle fixtures', article_documents)]:
+        length = sum(len(document) for document in documents)
+        stripped_length = sum(len(strip_raw_text_elements(document)) for document in documents)
+        print(f"{name}: {len(documents)} documents, {100 - stripped_length * 100 / length:.0f}% of the characters "
+              f"are script, style or svg")
+    print()
+    measure("strip_raw_text_elements", chunk_documents, strip_raw_text_elements, repetitions)
+    for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+        for pre_strip in [False, True]:
+            parser = ChunkHTMLParser(parser_backend=parser_backend, pre_strip_raw_text_elements=pre_strip)
+            measure(f"chunks {parser_backend}{' pre-stripped' if pre_strip else ''}", chunk_documents,
+                    parser.to_chunks, repetitions)
+    for pre_strip in [False, True]:
+        extractor = HtmlArticleExtractor(pre_strip_raw_text_elements=pre_strip)
+        for name, documents in [('htmlchunks', chunk_documents), ('htmlarticle', article_documents)]:
+            measure(f"article {name}{' pre-stripped' if pre_strip else ''}", documents,
+                    lambda document: extractor.extract(document, SOURCE_URL), repetitions)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
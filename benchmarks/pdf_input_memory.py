@@ -0,0 +1,46 @@
+"""Compares the peak memory of converting a pdf from bytes, from a memory map and from a path.
+
+Every input type is converted in a fresh interpreter, so the reported peak RSS is not shared between runs.
+
+    PYTHONPATH=. python benchmarks/pdf_input_memory.py path/to/document.pdf
+"""
+import mmap
+import resource
+import subprocess
+import sys
+from pathlib import Path
+
+INPUT_TYPES = ['bytes', 'mmap', 'path']
+
+
+def convert(input_type, pdf_path):
+    from docconv.pdf import Pdf2TextConverter
+
+    converter = Pdf2TextConverter()
+    output = open('/dev/null', 'w')
+    if input_type == 'bytes':
+        with open(pdf_path, 'rb') as f:
+            converter.to_text(f.read(), output=output)
+    elif input_type == 'mmap':
+        with open(pdf_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as pdf_map:
+            converter.to_text(pdf_map, output=output)
+    else:
+        converter.to_text(Path(pdf_path), output=output)
+    # ru_maxrss is reported in kilobytes on linux
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main(pdf_path):
+    print(f"{'input':<8}{'peak rss (MB)':>15}")
+    for input_type in INPUT_TYPES:
+        completed_process = subprocess.run([sys.executable, __file__, '--convert', input_type, pdf_path],
+                                           check=True, capture_output=True, text=True)
+        peak_rss_in_mb = int(completed_process.stdout.strip()) / 1024
+        print(f"{input_type:<8}{peak_rss_in_mb:>15.1f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--convert':
+        convert(sys.argv[2], sys.argv[3])
+    else:
+        main(sys.argv[1])
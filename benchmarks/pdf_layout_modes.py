@@ -0,0 +1,27 @@
+"""Compares throughput and output size of the text layout modes of Pdf2TextConverter.
+
+    PYTHONPATH=. python benchmarks/pdf_layout_modes.py path/to/document.pdf [repetitions]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+from docconv.pdf import Pdf2TextConverter
+
+LAYOUT_MODES = [Pdf2TextConverter.PHYSICAL_LAYOUT, Pdf2TextConverter.RAW_ORDER_LAYOUT,
+                Pdf2TextConverter.COMPACT_LAYOUT]
+
+
+def main(pdf_path, repetitions):
+    page_count = Pdf2TextConverter().metadata(Path(pdf_path)).page_count
+    print(f"{'layout':<10}{'pages/s':>12}{'chars':>12}{'whitespace':>12}")
+    for layout_mode in LAYOUT_MODES:
+        converter = Pdf2TextConverter(layout_mode=layout_mode)
+        seconds = timeit.timeit(lambda: converter.to_text(Path(pdf_path)), number=repetitions)
+        text = converter.to_text(Path(pdf_path)).text
+        whitespace_ratio = sum(1 for char in text if char.isspace()) / len(text) if text else 0
+        print(f"{layout_mode:<10}{page_count * repetitions / seconds:>12.1f}{len(text):>12}{whitespace_ratio:>12.1%}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 5)
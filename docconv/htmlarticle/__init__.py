@@ -1,17 +1,26 @@
-import copy
 import json
 from datetime import datetime
 import calendar
+from itertools import islice
 import regex
 from urllib.parse import urljoin
+import lxml.html
+from lxml import etree
 from newspaper import Article as NewspaperArticle
+from newspaper.article import ArticleDownloadState
 from newspaper.cleaners import DocumentCleaner
 import dateutil
 from newspaper.outputformatters import OutputFormatter
 from newspaper.videos.extractors import VideoExtractor
 
+from docconv.htmlchunks import HtmlDocument, DECODED_BEFORE_LXML_ENCODINGS, decode_html, detect_encoding, \
+    strip_raw_text_elements, truncate_html
+
 MAX_NUMBER_OF_WORDS_IN_AUTHOR = 10
 
+# size of the parts in which pages are fed to lxml, so that parsing can stop early
+PARSE_PART_LENGTH = 65536
+
 IMAGE_URL_EXCLUSION_PATTERN = regex.compile(r".svg\s*$|placeholder|base64|icon|javascript", regex.IGNORECASE)
 AUTHOR_KEYWORD_PATTERN_PART = r'(?:By|Author|Authors|Author\(s\)):'
 AUTHOR_DIRECTLY_AFTER_KEYWORD_PATTERN = regex.compile(rf"{AUTHOR_KEYWORD_PATTERN_PART}\s*(.+?)\s*+$",
@@ -45,15 +54,42 @@ PUBLISH_DATE_TAGS = [
 
 class HtmlArticleExtractor:
 
-    def __init__(self):
-        pass
-
-    def extract(self, html, source_url):
+    def __init__(self, max_input_length=None, max_nodes=None, max_chars=None, pre_strip_raw_text_elements=False):
+        """HtmlArticle.truncated tells whether a limit was hit."""
+        self.max_input_length = max_input_length
+        self.max_nodes = max_nodes
+        self.max_chars = max_chars
+        self.pre_strip_raw_text_elements = pre_strip_raw_text_elements
+
+    def extract(self, html, source_url, encoding=None):
+        """max_input_length and pre_strip_raw_text_elements do not apply to an HtmlDocument."""
+        html_document = None
+        if isinstance(html, HtmlDocument):
+            html_document = html
+            html, encoding = html_document.source, html_document.encoding
         if not html or not html.strip():
             return HtmlArticle("")
+        truncated = False
+        if html_document is None:
+            if self.max_input_length is not None and len(html) > self.max_input_length:
+                html = truncate_html(html, self.max_input_length, encoding)
+                truncated = True
+            if self.pre_strip_raw_text_elements:
+                html = strip_raw_text_elements(html, keep_ld_json=True)
+        return self.__extract(html, source_url, encoding, html_document, truncated)
+
+    def __extract(self, html, source_url, encoding=None, html_document=None, truncated=False):
         newspaper_article = NewspaperArticle(source_url)
-        newspaper_article.download(input_html=html)
-        self.parse_for_relevant_attributes(newspaper_article)
+        if isinstance(html, bytes) or html_document is not None:
+            newspaper_article.html = html
+            newspaper_article.download_state = ArticleDownloadState.SUCCESS
+        else:
+            newspaper_article.download(input_html=html)
+        truncated = self.parse_for_relevant_attributes(newspaper_article, encoding, html_document) or truncated
+        text = newspaper_article.text
+        if self.max_chars is not None and len(text) > self.max_chars:
+            text = text[:self.max_chars]
+            truncated = True
         top_node = self.get_unmodified_top_node_from_original_html(newspaper_article)
         image_urls = []
         authors = []
@@ -69,23 +105,26 @@ class HtmlArticleExtractor:
                 or self.extract_authors_from_div_with_author_class(top_node) \
                 or self.extract_authors_from_div_with_author_class_above_article(top_node)
 
-        return HtmlArticle(newspaper_article.text,
+        return HtmlArticle(text,
                            authors=self.unique_list(authors),
                            title=newspaper_article.title,
                            image_urls=image_urls,
                            publication_date=newspaper_article.publish_date[1]
                            if newspaper_article.publish_date else None,
                            publication_date_display=newspaper_article.publish_date[0]
-                           if newspaper_article.publish_date else None)
+                           if newspaper_article.publish_date else None,
+                           truncated=truncated)
 
-    def parse_for_relevant_attributes(self, newspaper_article):
+    def parse_for_relevant_attributes(self, newspaper_article, encoding=None, html_document=None):
+        """Returns whether elements were removed because of max_nodes."""
         newspaper_article.throw_if_not_downloaded_verbose()
 
-        newspaper_article.doc = newspaper_article.config.get_parser().fromstring(newspaper_article.html)
-        newspaper_article.clean_doc = copy.deepcopy(newspaper_article.doc)
+        newspaper_article.doc = self.parse_html(newspaper_article, encoding)
+        truncated = self.remove_elements_after_max_nodes(newspaper_article.doc)
+        newspaper_article.clean_doc = newspaper_article.doc
 
         if newspaper_article.doc is None:
-            return
+            return truncated
 
         parse_candidate = newspaper_article.get_parse_candidate()
         newspaper_article.link_hash = parse_candidate.link_hash  # MD5
@@ -113,7 +152,7 @@ class HtmlArticleExtractor:
             newspaper_article.set_movies(video_extractor.get_videos())
 
             newspaper_article.top_node = newspaper_article.extractor.post_cleanup(newspaper_article.top_node)
-            newspaper_article.clean_top_node = copy.deepcopy(newspaper_article.top_node)
+            newspaper_article.clean_top_node = _NodeIdentity(newspaper_article.top_node)
 
             text, article_html = output_formatter.get_formatted(
                 newspaper_article.top_node)
@@ -122,6 +161,72 @@ class HtmlArticleExtractor:
 
         newspaper_article.is_parsed = True
         newspaper_article.release_resources()
+        # the modified document is released before the unmodified top node is looked up
+        newspaper_article.doc = newspaper_article.top_node = newspaper_article.clean_doc = None
+        if newspaper_article.clean_top_node is not None:
+            if html_document is not None and self.max_nodes is None:
+                newspaper_article.clean_doc = html_document.tree
+            else:
+                newspaper_article.clean_doc = self.parse_html(newspaper_article, encoding,
+                                                              until_end_of=newspaper_article.clean_top_node)
+                self.remove_elements_after_max_nodes(newspaper_article.clean_doc)
+        return truncated
+
+    def remove_elements_after_max_nodes(self, doc):
+        if doc is None or self.max_nodes is None:
+            return False
+        # the root is always kept
+        first_removed_node = next(islice(doc.iter(), max(self.max_nodes, 1), None), None)
+        if first_removed_node is None:
+            return False
+        # removes the first node after the limit with its tail, all nodes following it and the following siblings and
+        # tails of its ancestors
+        node = first_removed_node
+        parent = node.getparent()
+        while parent is not None:
+            for sibling in list(node.itersiblings()):
+                parent.remove(sibling)
+            if node is not first_removed_node:
+                node.tail = None
+            node, parent = parent, parent.getparent()
+        first_removed_node.getparent().remove(first_removed_node)
+        return True
+
+    def parse_html(self, newspaper_article, encoding=None, until_end_of=None):
+        """Stops parsing after more than max_nodes elements or the end of the node until_end_of identifies."""
+        html = newspaper_article.html
+        if isinstance(html, bytes):
+            encoding = detect_encoding(html, encoding)
+            if encoding not in DECODED_BEFORE_LXML_ENCODINGS:
+                try:
+                    return self.__parse(html, encoding, until_end_of)
+                except (LookupError, etree.XMLSyntaxError):
+                    # an encoding libxml2 does not know or bytes it rejects
+                    pass
+            html = decode_html(html, encoding)
+        try:
+            return self.__parse(html, None, until_end_of)
+        except etree.XMLSyntaxError:
+            return None
+
+    def __parse(self, html, encoding, until_end_of):
+        parser = etree.HTMLPullParser(events=('start', 'end'), huge_tree=True, encoding=encoding)
+        parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+        number_of_elements = 0
+        end_node = None
+        for part_start in range(0, len(html), PARSE_PART_LENGTH):
+            parser.feed(html[part_start:part_start + PARSE_PART_LENGTH])
+            for event, element in parser.read_events():
+                if event == 'start':
+                    number_of_elements += 1
+                    # the elements after max_nodes are removed, so the rest of the page is not needed
+                    if self.max_nodes is not None and number_of_elements > self.max_nodes:
+                        return parser.close()
+                    if end_node is None and until_end_of is not None and until_end_of.matches(element):
+                        end_node = element
+                elif element is end_node:
+                    return parser.close()
+        return parser.close()
 
     @staticmethod
     def get_unmodified_top_node_from_original_html(newspaper_article):
@@ -330,13 +435,28 @@ class HtmlArticleExtractor:
             return None
 
 
+class _NodeIdentity:
+    # what get_unmodified_top_node_from_original_html needs of a node to find it in the unmodified document
+
+    def __init__(self, node):
+        self.tag = node.tag
+        self.attrib = {'class': node.attrib['class']} if 'class' in node.attrib else {}
+        self.sourceline = node.sourceline
+
+    def matches(self, node):
+        return node.tag == self.tag and node.sourceline == self.sourceline \
+            and ('class' not in self.attrib or node.get('class') == self.attrib['class'])
+
+
 class HtmlArticle:
 
-    def __init__(self, text, title='', authors=[], publication_date=None, publication_date_display=None, image_urls=[]):
+    def __init__(self, text, title='', authors=[], publication_date=None, publication_date_display=None, image_urls=[],
+                 truncated=False):
         self.text = text
         self.authors = authors
         self.image_urls = image_urls
         self.publication_date = publication_date
         self.publication_date_display = publication_date_display
         self.title = title
+        self.truncated = truncated
 
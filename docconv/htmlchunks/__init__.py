@@ -1,27 +1,257 @@
+import codecs
+import multiprocessing
+import re
+from array import array
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import islice
+from urllib.parse import urlsplit
+from html.parser import HTMLParser as HTMLTokenizer
+
 from bs4 import BeautifulSoup
 from bs4.element import PreformattedString, NavigableString
+import lxml.html
+from lxml import etree
+
+HTML_PARSER_BACKEND = 'html.parser'
+LXML_BACKEND = 'lxml'
+HTML5LIB_BACKEND = 'html5lib'
+# chunking directly on the lxml tree without building BeautifulSoup objects; soups are built with lxml
+LXML_NATIVE_BACKEND = 'lxml-native'
+
+# bytes searched for a meta charset or xml encoding declaration if html is given as bytes
+ENCODING_SNIFF_LENGTH = 4096
+META_CHARSET_PATTERN = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+XML_ENCODING_PATTERN = re.compile(rb"^\s*<\?xml[^>]+encoding\s*=\s*[\"']([\w.:-]+)", re.IGNORECASE)
+CHARSET_PARAMETER_PATTERN = re.compile(r"charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+BYTE_ORDER_MARKS = [(codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be')]
+# encodings of html bytes that are decoded before lxml parses them: libxml2 rejects the bytes windows-1252 leaves
+# undefined instead of replacing them
+DECODED_BEFORE_LXML_ENCODINGS = {'cp1252'}
+
+# elements whose raw text content can be cut out of the markup before parsing. Self-closing start tags are not
+# matched, as the pattern would otherwise cut everything up to the next end tag of their name
+RAW_TEXT_ELEMENT_PATTERN = r"<(script|style|svg)(?=[\s/>])([^>]*)(?<!/)>.*?</\1\s*>"
+RAW_TEXT_ELEMENT_STR_PATTERN = re.compile(RAW_TEXT_ELEMENT_PATTERN, re.IGNORECASE | re.DOTALL)
+RAW_TEXT_ELEMENT_BYTES_PATTERN = re.compile(RAW_TEXT_ELEMENT_PATTERN.encode(), re.IGNORECASE | re.DOTALL)
+
+# batches of documents submitted ahead to each worker of the batch chunking pool
+BATCHES_READ_AHEAD_PER_WORKER = 2
+
+SELECTOR_PATTERN = re.compile(r"(?P<tag>[\w:-]+)?(?P<conditions>(?:[.#][\w-]+|\[[\w:-]+(?:\*?=[^\]]*)?\])*)")
+SELECTOR_CONDITION_PATTERN = re.compile(r"([.#])([\w-]+)|\[([\w:-]+)(?:(\*?=)([^\]]*))?\]")
 
 
 class Html2TextChunksConverter:
 
     @staticmethod
-    def to_text_chunks(html_content, custom_tags_to_remove=[]):
-        parser = ChunkHTMLParser(custom_tags_to_remove=custom_tags_to_remove)
-        parser.parse(html_content)
-        return parser.chunks
+    def to_text_chunks(html_content, custom_tags_to_remove=[], parser_backend=HTML_PARSER_BACKEND,
+                       selectors_to_remove=[], boilerplate_index=None, source_url=None, encoding=None):
+        """With a boilerplate_index, the boilerplate chunks of the host of source_url are dropped."""
+        parser = ChunkHTMLParser(custom_tags_to_remove=custom_tags_to_remove, parser_backend=parser_backend,
+                                 selectors_to_remove=selectors_to_remove)
+        chunks = parser.to_chunks(html_content, encoding=encoding)
+        if boilerplate_index is not None:
+            chunks = boilerplate_index.filter(source_url, chunks)
+        return chunks
+
+    @staticmethod
+    def to_chunk_spans(html_content, custom_tags_to_remove=[], parser_backend=HTML_PARSER_BACKEND,
+                       selectors_to_remove=[], encoding=None):
+        parser = ChunkHTMLParser(custom_tags_to_remove=custom_tags_to_remove, parser_backend=parser_backend,
+                                 selectors_to_remove=selectors_to_remove)
+        return parser.parse_spans(html_content, encoding=encoding)
+
+    @staticmethod
+    def iter_batch_text_chunks(html_contents, workers=2, chunksize=16, ordered=True, custom_tags_to_remove=[],
+                               parser_backend=HTML_PARSER_BACKEND, selectors_to_remove=[], max_input_length=None,
+                               max_nodes=None, max_chars=None):
+        """Yields a ChunkingResult per document; an error is returned in its result instead of raised."""
+        parser = ChunkHTMLParser(custom_tags_to_remove=custom_tags_to_remove, parser_backend=parser_backend,
+                                 selectors_to_remove=selectors_to_remove, max_input_length=max_input_length,
+                                 max_nodes=max_nodes, max_chars=max_chars)
+        html_contents = iter(html_contents)
+        batches = iter(lambda: list(islice(html_contents, chunksize)), [])
+        if workers <= 1:
+            first_index = 0
+            for batch in batches:
+                yield from _to_text_chunks_batch(parser, first_index, batch)
+                first_index += len(batch)
+            return
+        # spawned instead of forked, as forking a process with several threads can deadlock
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending_futures = deque()
+            first_index = 0
+            try:
+                while True:
+                    for batch in islice(batches, workers * BATCHES_READ_AHEAD_PER_WORKER - len(pending_futures)):
+                        pending_futures.append(executor.submit(_to_text_chunks_batch, parser, first_index, batch))
+                        first_index += len(batch)
+                    if not pending_futures:
+                        return
+                    if ordered:
+                        yield from pending_futures.popleft().result()
+                    else:
+                        done_futures, _ = wait(pending_futures, return_when=FIRST_COMPLETED)
+                        for future in done_futures:
+                            pending_futures.remove(future)
+                            yield from future.result()
+            finally:
+                for future in pending_futures:
+                    future.cancel()
+
+    @staticmethod
+    def iter_text_chunks(html_parts, custom_tags_to_remove=[], selectors_to_remove=[], min_chunk_length=-1):
+        """html_parts is an iterable of str, read only as far as chunks are taken."""
+        parser = StreamingChunkHTMLParser(custom_tags_to_remove=custom_tags_to_remove,
+                                          min_chunk_length=min_chunk_length, selectors_to_remove=selectors_to_remove)
+        for html_part in html_parts:
+            yield from parser.feed(html_part)
+        yield from parser.close()
+
+
+class ChunkingResult:
+    """Result of one document of a batch; chunks is None if chunking raised error."""
+
+    def __init__(self, index, chunks=None, error=None, truncated=False):
+        self.index = index
+        self.chunks = chunks
+        self.error = error
+        self.truncated = truncated
+
+
+def _to_text_chunks_batch(parser, first_index, html_contents):
+    results = []
+    for index, html_content in enumerate(html_contents, first_index):
+        try:
+            results.append(parser.to_chunking_result(html_content, index=index))
+        except Exception as ex:
+            results.append(ChunkingResult(index, error=ex))
+    return results
+
+
+class HtmlDocument:
+    """A page parsed once, to be passed instead of html to both extractors. Its tree must not be modified."""
+
+    def __init__(self, html, encoding=None, pre_strip_raw_text_elements=False):
+        self.html = html
+        self.encoding = encoding
+        self.pre_strip_raw_text_elements = pre_strip_raw_text_elements
+        self.__tree = None
+
+    @property
+    def source(self):
+        return strip_raw_text_elements(self.html, keep_ld_json=True) if self.pre_strip_raw_text_elements else self.html
+
+    @property
+    def tree(self):
+        """None for blank html."""
+        if self.__tree is None and is_not_blank(self.html):
+            self.__tree = _parse_lxml_tree(self.source, self.encoding, lxml.html.HTMLParser)
+        return self.__tree
+
+    @property
+    def body(self):
+        return self.tree.find('body') if self.tree is not None else None
+
+
+class BoilerplateIndex:
+    """Detects chunks that occur on more than max_page_fraction of the pages of a host."""
+
+    def __init__(self, max_page_fraction=0.5, min_pages=10, max_chunks_per_host=10000, max_hosts=1000):
+        self.max_page_fraction = max_page_fraction
+        self.min_pages = min_pages
+        self.max_chunks_per_host = max_chunks_per_host
+        self.max_hosts = max_hosts
+        # host -> _HostChunkCounts, least recently used first
+        self.__hosts = OrderedDict()
+
+    def add_page(self, source_url, chunks):
+        host = self.get_host(source_url)
+        if host is None:
+            return
+        host_chunk_counts = self.__get_host_chunk_counts(host)
+        host_chunk_counts.number_of_pages += 1
+        page_counts = host_chunk_counts.page_counts
+        for fingerprint in {self.fingerprint(chunk) for chunk in chunks}:
+            page_counts[fingerprint] = page_counts.get(fingerprint, 0) + 1
+            page_counts.move_to_end(fingerprint)
+        while len(page_counts) > self.max_chunks_per_host:
+            page_counts.popitem(last=False)
+
+    def is_boilerplate(self, source_url, chunk):
+        host_chunk_counts = self.__hosts.get(self.get_host(source_url))
+        if host_chunk_counts is None or host_chunk_counts.number_of_pages < self.min_pages:
+            return False
+        page_count = host_chunk_counts.page_counts.get(self.fingerprint(chunk), 0)
+        return page_count > self.max_page_fraction * host_chunk_counts.number_of_pages
+
+    def filter(self, source_url, chunks):
+        """Also adds the page to the index."""
+        if self.get_host(source_url) is None:
+            return chunks
+        self.add_page(source_url, chunks)
+        return [chunk for chunk in chunks if not self.is_boilerplate(source_url, chunk)]
+
+    @staticmethod
+    def fingerprint(chunk):
+        # a stable hash, so that indexes of different processes agree
+        return blake2b(("%s\0%s" % (chunk.chunk_type, chunk.data)).encode(), digest_size=8).digest()
+
+    @staticmethod
+    def get_host(source_url):
+        return urlsplit(source_url).hostname if source_url else None
+
+    def __get_host_chunk_counts(self, host):
+        host_chunk_counts = self.__hosts.get(host)
+        if host_chunk_counts is None:
+            host_chunk_counts = self.__hosts[host] = _HostChunkCounts()
+            if len(self.__hosts) > self.max_hosts:
+                self.__hosts.popitem(last=False)
+        else:
+            self.__hosts.move_to_end(host)
+        return host_chunk_counts
+
+
+class _HostChunkCounts:
+
+    def __init__(self):
+        self.number_of_pages = 0
+        # chunk fingerprint -> number of pages it occurred on, least recently seen first
+        self.page_counts = OrderedDict()
 
 
 class ArticleDetector:
 
+    # size of the parts in which is_article_html feeds the document to the chunker
+    HTML_PART_LENGTH = 8192
+
     def __init__(self,  min_article_length=1000, min_chunk_length=50):
         self.min_article_length = min_article_length
         self.min_chunk_length = min_chunk_length
 
     def is_article(self, chunks):
-        num_of_characters_in_valid_chunks = sum(len(chunk.data) for chunk in chunks
-                                                if len(chunk.data) >= self.min_chunk_length)
+        """chunks are consumed only until min_article_length is reached."""
+        num_of_characters_in_valid_chunks = 0
+        for chunk in chunks:
+            if len(chunk.data) >= self.min_chunk_length:
+                num_of_characters_in_valid_chunks += len(chunk.data)
+                if num_of_characters_in_valid_chunks >= self.min_article_length:
+                    return True
         return num_of_characters_in_valid_chunks >= self.min_article_length
 
+    def is_article_html(self, html_content, custom_tags_to_remove=[], selectors_to_remove=[]):
+        """Chunks html in parts and stops as soon as the decision is made."""
+        if is_blank(html_content):
+            return self.is_article([])
+        html_parts = (html_content[start:start + self.HTML_PART_LENGTH]
+                      for start in range(0, len(html_content), self.HTML_PART_LENGTH))
+        return self.is_article(Html2TextChunksConverter.iter_text_chunks(
+            html_parts, custom_tags_to_remove=custom_tags_to_remove, selectors_to_remove=selectors_to_remove,
+            min_chunk_length=self.min_chunk_length))
+
 
 class ArticleChunksExtractor:
 
@@ -40,6 +270,25 @@ class ArticleChunksExtractor:
                 headline_idx = i
         return chunks[headline_idx:]
 
+    def iter_extract(self, chunks, all_chunks_if_no_paragraph=False):
+        """Lazy variant of extract; without a long paragraph nothing is yielded, unless all_chunks_if_no_paragraph."""
+        preceding_chunks = deque(maxlen=5)
+        chunks_before_paragraph = [] if all_chunks_if_no_paragraph else None
+        chunks = iter(chunks)
+        for chunk in chunks:
+            if len(chunk.data) >= self.min_text_paragraph_length:
+                headline_idx = next((idx for idx, preceding_chunk in enumerate(preceding_chunks)
+                                     if preceding_chunk.chunk_type == Chunk.headline_type), len(preceding_chunks))
+                yield from list(preceding_chunks)[headline_idx:]
+                yield chunk
+                yield from chunks
+                return
+            preceding_chunks.append(chunk)
+            if chunks_before_paragraph is not None:
+                chunks_before_paragraph.append(chunk)
+        if chunks_before_paragraph is not None:
+            yield from chunks_before_paragraph
+
     @staticmethod
     def get_range_for_five_preceeding_elements(index):
         return range(index, max(-1, index - 6), -1)
@@ -47,41 +296,65 @@ class ArticleChunksExtractor:
 
 class HTMLParser(object):
 
-    def __init__(self, custom_tags_to_remove=[]):
+    TAGS_TO_REMOVE = ['script', 'style', 'header', 'footer']
+
+    def __init__(self, custom_tags_to_remove=[], parser_backend=HTML_PARSER_BACKEND, selectors_to_remove=[],
+                 pre_strip_raw_text_elements=False):
+        """selectors_to_remove are simple selectors like 'div.cookie-banner' or '#nav'."""
         self.custom_tags_to_remove = custom_tags_to_remove
+        self.parser_backend = parser_backend
+        self.pre_strip_raw_text_elements = pre_strip_raw_text_elements
+        self.removal_rules = RemovalRules.compile(tuple(self.TAGS_TO_REMOVE) + tuple(custom_tags_to_remove)
+                                                  + tuple(selectors_to_remove))
 
-    def parse(self, html_input):
+    def parse(self, html_input, encoding=None):
         body = None
         if is_not_blank(html_input):
-            body = self.__get_cleansed_html_body(html_input)
+            body = self.__get_cleansed_html_body(html_input, encoding)
         return body
 
-    def to_text(self, html_input, text_separator="\n"):
+    def to_text(self, html_input, text_separator="\n", encoding=None):
         if is_blank(html_input):
             return None
-        soup = self._get_clean_soup(html_input)
+        soup = self._get_clean_soup(html_input, encoding)
         return soup.getText(separator=text_separator)
 
-    def __get_cleansed_html_body(self, html_input):
-        soup = self._get_clean_soup(html_input)
+    def __get_cleansed_html_body(self, html_input, encoding):
+        soup = self._get_clean_soup(html_input, encoding)
         return soup.body
 
-    def _get_clean_soup(self, html_input):
-        soup = BeautifulSoup(html_input, "html.parser")
-        declarations_and_comments = soup.findAll(text=lambda text: isinstance(text, PreformattedString))
-        self.delete_subtree(declarations_and_comments)
-        self.__find_and_delete_sub_tree(soup, 'script')
-        self.__find_and_delete_sub_tree(soup, 'style')
-        self.__find_and_delete_sub_tree(soup, 'header')
-        self.__find_and_delete_sub_tree(soup, 'footer')
-        for tag_to_remove in self.custom_tags_to_remove:
-            self.__find_and_delete_sub_tree(soup, tag_to_remove)
-
+    def _get_clean_soup(self, html_input, encoding=None):
+        if self.pre_strip_raw_text_elements:
+            html_input = strip_raw_text_elements(html_input)
+        tree_builder = LXML_BACKEND if self.parser_backend == LXML_NATIVE_BACKEND else self.parser_backend
+        if isinstance(html_input, bytes):
+            # BeautifulSoup decodes in python anyway, and treats from_encoding only as a hint that it drops for a
+            # guessed encoding on the first undecodable byte
+            html_input = decode_html(html_input, encoding)
+        soup = BeautifulSoup(html_input, tree_builder)
+        self.delete_subtree(self.__find_elements_to_remove(soup))
         return soup
 
-    def __find_and_delete_sub_tree(self, soup, tag_name, attr={}):
-        script_elements = soup.findAll(tag_name, attr)
-        self.delete_subtree(script_elements)
+    def __find_elements_to_remove(self, soup):
+        # a single walk that does not descend into removed subtrees
+        elements_to_remove = []
+        stack = [soup]
+        while stack:
+            for element in stack.pop().contents:
+                if isinstance(element, NavigableString):
+                    if isinstance(element, PreformattedString):
+                        elements_to_remove.append(element)
+                elif self.removal_rules.matches(element.name, element.attrs):
+                    elements_to_remove.append(element)
+                else:
+                    stack.append(element)
+        return elements_to_remove
+
+    def _get_lxml_body(self, html_input, encoding=None):
+        if self.pre_strip_raw_text_elements:
+            html_input = strip_raw_text_elements(html_input)
+        root = _parse_lxml_tree(html_input, encoding, etree.HTMLParser)
+        return root.find('body') if root is not None else None
 
     @staticmethod
     def delete_subtree(comments):
@@ -92,43 +365,326 @@ class ChunkHTMLParser(HTMLParser):
 
     FLOW_PRESERVING_TAG = ['span', 'sub', 'sup', 'abbr', 'acronym', 'em', 'b', 'font', 'i', 'strong', 'u', 'a']
 
-    def __init__(self, custom_tags_to_remove=[], min_chunk_length=-1):
-        super(ChunkHTMLParser, self).__init__(custom_tags_to_remove)
+    def __init__(self, custom_tags_to_remove=[], min_chunk_length=-1, parser_backend=HTML_PARSER_BACKEND,
+                 selectors_to_remove=[], max_input_length=None, max_nodes=None, max_chars=None,
+                 pre_strip_raw_text_elements=False):
+        """Whether a limit was hit is available as truncated after parse."""
+        super(ChunkHTMLParser, self).__init__(custom_tags_to_remove, parser_backend, selectors_to_remove,
+                                              pre_strip_raw_text_elements)
         self.min_chunk_length = min_chunk_length
+        self.max_input_length = max_input_length
+        self.max_nodes = max_nodes
+        self.max_chars = max_chars
         self.chunks = []
+        self.truncated = False
+
+    def parse(self, html_input, encoding=None):
+        chunking_result = self.to_chunking_result(html_input, encoding)
+        self.chunks = chunking_result.chunks
+        self.truncated = chunking_result.truncated
+
+    def to_chunks(self, html_input, encoding=None):
+        """Keeps no state in the parser, so unlike parse it can be called by several threads."""
+        return self.to_chunking_result(html_input, encoding).chunks
+
+    def to_chunking_result(self, html_input, encoding=None, index=None):
+        chunk_builder = self.__create_chunk_builder(_ChunkBuilder)
+        self.__build_chunks(html_input, encoding, chunk_builder)
+        return ChunkingResult(index, chunks=chunk_builder.chunks, truncated=chunk_builder.truncated)
+
+    def parse_spans(self, html_input, encoding=None):
+        chunk_builder = self.__create_chunk_builder(_ChunkSpansBuilder)
+        self.__build_chunks(html_input, encoding, chunk_builder)
+        return chunk_builder.to_chunk_spans()
+
+    def __create_chunk_builder(self, chunk_builder_class):
+        return chunk_builder_class(self.FLOW_PRESERVING_TAG, self.min_chunk_length, max_nodes=self.max_nodes,
+                                   max_chars=self.max_chars)
+
+    def __build_chunks(self, html_input, encoding, chunk_builder):
+        is_input_truncated = self.max_input_length is not None and isinstance(html_input, (str, bytes)) \
+            and len(html_input) > self.max_input_length
+        if is_input_truncated:
+            html_input = truncate_html(html_input, self.max_input_length, encoding)
+        if isinstance(html_input, HtmlDocument):
+            # the tree of the document is shared, so it is traversed like the lxml-native backend does, which does
+            # not modify it
+            body = html_input.body
+            if body is not None:
+                self.__traverse_lxml(body, chunk_builder)
+        elif self.parser_backend == LXML_NATIVE_BACKEND:
+            body = self._get_lxml_body(html_input, encoding) if is_not_blank(html_input) else None
+            if body is not None:
+                self.__traverse_lxml(body, chunk_builder)
+        else:
+            body = super(ChunkHTMLParser, self).parse(html_input, encoding)
+            if body:
+                self.__traverse(body, chunk_builder)
+        chunk_builder.save_current_chunk_if_valid()
+        chunk_builder.truncated = chunk_builder.truncated or is_input_truncated
 
-    def parse(self, html_input):
-        body = super(ChunkHTMLParser, self).parse(html_input)
-        self.chunks = []
-        self.current_chunk = None
-        self.current_chunk_type = None
+    @staticmethod
+    def __traverse(elements, chunk_builder):
+        # explicit stack instead of recursion, so deeply nested documents do not hit the recursion limit
+        stack = [(iter(elements), False)]
+        while stack and not chunk_builder.truncated:
+            remaining_elements, was_flow_breaking_tag = stack[-1]
+            for element in remaining_elements:
+                if isinstance(element, NavigableString):
+                    chunk_builder.handle_text(element)
+                else:
+                    stack.append((iter(element.contents), chunk_builder.handle_start_tag(element.name)))
+                    break
+            else:
+                stack.pop()
+                if was_flow_breaking_tag:
+                    chunk_builder.save_current_chunk_if_valid()
+
+    def __traverse_lxml(self, body, chunk_builder):
+        # lxml keeps the text following an element as its tail, so it is handled after the element is closed
+        chunk_builder.handle_text(body.text)
+        stack = [(iter(body), False, None)]
+        while stack and not chunk_builder.truncated:
+            remaining_elements, was_flow_breaking_tag, tail = stack[-1]
+            for element in remaining_elements:
+                # comments and processing instructions have no string tag
+                if not isinstance(element.tag, str) or self.removal_rules.matches(element.tag, element.attrib):
+                    chunk_builder.handle_text(element.tail)
+                    continue
+                stack.append((iter(element), chunk_builder.handle_start_tag(element.tag), element.tail))
+                chunk_builder.handle_text(element.text)
+                break
+            else:
+                stack.pop()
+                if was_flow_breaking_tag:
+                    chunk_builder.save_current_chunk_if_valid()
+                chunk_builder.handle_text(tail)
+
+    def chunks_as_text(self):
+        if self.chunks:
+            return "\n".join([chunk.data for chunk in self.chunks])
+        return ""
+
+
+class StreamingChunkHTMLParser(HTMLTokenizer):
+    """Chunks a document fed in parts without building a DOM, with the same chunks as ChunkHTMLParser."""
+
+    FLOW_PRESERVING_TAG = ChunkHTMLParser.FLOW_PRESERVING_TAG
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+                 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+                 'nextid', 'spacer'}
 
-        if not body:
+    def __init__(self, custom_tags_to_remove=[], min_chunk_length=-1, selectors_to_remove=[]):
+        self.removal_rules = RemovalRules.compile(tuple(HTMLParser.TAGS_TO_REMOVE) + tuple(custom_tags_to_remove)
+                                                  + tuple(selectors_to_remove))
+        self.min_chunk_length = min_chunk_length
+        super(StreamingChunkHTMLParser, self).__init__(convert_charrefs=True)
+
+    def reset(self):
+        super(StreamingChunkHTMLParser, self).reset()
+        self.__chunk_builder = _ChunkBuilder(self.FLOW_PRESERVING_TAG, self.min_chunk_length)
+        # entries are (tag name, is flow breaking, is removed)
+        self.__open_tags = []
+        self.__body_is_open = False
+        self.__number_of_open_removed_tags = 0
+        self.__text_parts = []
+        self.__held_back_parts = []
+
+    def feed(self, html_part):
+        # the tokenizer rescans the whole content of an open script or style element on every feed, so parts are held
+        # back until they may contain its end tag
+        if self.cdata_elem is not None and html_part:
+            previous_char = self.__held_back_parts[-1][-1:] if self.__held_back_parts else self.rawdata[-1:]
+            self.__held_back_parts.append(html_part)
+            if '</' not in previous_char + html_part:
+                return []
+            html_part = "".join(self.__held_back_parts)
+            self.__held_back_parts = []
+        super(StreamingChunkHTMLParser, self).feed(html_part)
+        return self.__pop_chunks()
+
+    def close(self):
+        super(StreamingChunkHTMLParser, self).feed("".join(self.__held_back_parts))
+        super(StreamingChunkHTMLParser, self).close()
+        self.__flush_text()
+        self.__chunk_builder.save_current_chunk_if_valid()
+        chunks = self.__pop_chunks()
+        self.reset()
+        return chunks
+
+    def handle_starttag(self, tag, attrs):
+        self.__flush_text()
+        is_removed = self.removal_rules.matches(tag, {name: value or "" for name, value in attrs})
+        if tag == 'body' and not self.__body_is_open:
+            self.__body_is_open = True
+            self.__open_tags.append((tag, False, is_removed))
+            return
+        is_flow_breaking = self.__is_in_chunked_content() and not is_removed \
+            and self.__chunk_builder.handle_start_tag(tag)
+        if tag in self.VOID_TAGS:
+            self.__close_tag(is_flow_breaking, is_removed=False)
+        else:
+            self.__open_tags.append((tag, is_flow_breaking, is_removed))
+            if is_removed:
+                self.__number_of_open_removed_tags += 1
+
+    def handle_endtag(self, tag):
+        self.__flush_text()
+        if not any(open_tag == tag for open_tag, _, _ in self.__open_tags):
             return
+        while True:
+            open_tag, is_flow_breaking, is_removed = self.__open_tags.pop()
+            if open_tag == 'body' and not any(tag_name == 'body' for tag_name, _, _ in self.__open_tags):
+                self.__body_is_open = False
+            self.__close_tag(is_flow_breaking, is_removed)
+            if open_tag == tag:
+                return
+
+    def handle_data(self, data):
+        if self.__is_in_chunked_content():
+            self.__text_parts.append(data)
+
+    def handle_comment(self, data):
+        self.__flush_text()
+
+    def handle_decl(self, decl):
+        self.__flush_text()
+
+    def handle_pi(self, data):
+        self.__flush_text()
+
+    def unknown_decl(self, data):
+        self.__flush_text()
+
+    def __close_tag(self, is_flow_breaking, is_removed):
+        if is_removed:
+            self.__number_of_open_removed_tags -= 1
+        if is_flow_breaking:
+            self.__chunk_builder.save_current_chunk_if_valid()
+
+    def __is_in_chunked_content(self):
+        return self.__body_is_open and self.__number_of_open_removed_tags == 0
+
+    def __flush_text(self):
+        # the tokenizer may split a text node, e.g. at the end of a fed part, so its parts are joined first
+        if self.__text_parts:
+            self.__chunk_builder.handle_text("".join(self.__text_parts))
+            self.__text_parts = []
+
+    def __pop_chunks(self):
+        chunks = self.__chunk_builder.chunks
+        self.__chunk_builder.chunks = []
+        return chunks
+
+
+class RemovalRules:
+    """Simple selectors made of a tag name, '.class', '#id', '[attr]', '[attr=value]' and '[attr*=value]'."""
+
+    def __init__(self, selectors):
+        self.removed_tag_names = set()
+        self.conditional_rules_by_tag_name = {}
+        self.conditional_rules_for_all_tags = []
+        for selector in selectors:
+            tag_name, conditions = self.__parse_selector(selector)
+            if not conditions:
+                self.removed_tag_names.add(tag_name)
+            elif tag_name:
+                self.conditional_rules_by_tag_name.setdefault(tag_name, []).append(conditions)
+            else:
+                self.conditional_rules_for_all_tags.append(conditions)
 
-        self.__traverse(body)
-        self.__save_current_chunk_if_valid()
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def compile(selectors):
+        return RemovalRules(selectors)
 
-    def __save_current_chunk_if_valid(self):
-        # not correct; counts space added in handleText too
-        if self.current_chunk is not None and len(self.current_chunk.data) >= self.min_chunk_length:
-            self.chunks.append(self.current_chunk)
-        self.current_chunk = None
-
-    def __traverse(self, elements):
-        for element in elements:
-            if isinstance(element, NavigableString):
-                self.__handle_text(element)
+    def matches(self, tag_name, attributes):
+        if tag_name in self.removed_tag_names:
+            return True
+        rules = self.conditional_rules_by_tag_name.get(tag_name)
+        if rules and any(self.__matches_conditions(conditions, attributes) for conditions in rules):
+            return True
+        return any(self.__matches_conditions(conditions, attributes)
+                   for conditions in self.conditional_rules_for_all_tags)
+
+    @staticmethod
+    def __parse_selector(selector):
+        selector_match = SELECTOR_PATTERN.fullmatch(selector.strip())
+        if not selector_match or not selector.strip():
+            raise ValueError("Unsupported selector '%s'" % selector)
+        conditions = []
+        for prefix, name, attribute, operator, value in \
+                SELECTOR_CONDITION_PATTERN.findall(selector_match.group('conditions')):
+            if prefix == '.':
+                conditions.append(('class', '~=', name))
+            elif prefix == '#':
+                conditions.append(('id', '=', name))
             else:
-                self.__set_current_chunk_type(element)
-                was_flow_breaking_tag = self.__handle_tag(element)
-                self.__traverse(element.contents)
-                if was_flow_breaking_tag:
-                    self.__save_current_chunk_if_valid()
+                conditions.append((attribute, operator, value.strip('\'"')))
+        return selector_match.group('tag'), conditions
+
+    @staticmethod
+    def __matches_conditions(conditions, attributes):
+        for attribute, operator, expected_value in conditions:
+            value = attributes.get(attribute)
+            if value is None:
+                return False
+            # BeautifulSoup returns the class attribute as list
+            value = " ".join(value) if isinstance(value, list) else value
+            if operator == '~=' and expected_value not in value.split() \
+                    or operator == '=' and value != expected_value \
+                    or operator == '*=' and expected_value not in value:
+                return False
+        return True
+
+
+class _ChunkBuilder:
+
+    def __init__(self, flow_preserving_tags, min_chunk_length, max_nodes=None, max_chars=None):
+        self.flow_preserving_tags = flow_preserving_tags
+        self.min_chunk_length = min_chunk_length
+        self.max_nodes = max_nodes
+        self.max_chars = max_chars
+        self.chunks = []
+        # the text of the current chunk is kept as parts with their joined length, so that chunks shorter than
+        # min_chunk_length are dropped without being joined or turned into a Chunk
+        self.current_text_parts = None
+        self.current_text_length = 0
+        self.current_text_type = None
+        self.current_chunk_type = None
+        self.number_of_nodes = 0
+        self.number_of_chars = 0
+        # set when a limit was hit; the traversal stops then
+        self.truncated = False
 
-    def __set_current_chunk_type(self, element):
-        if element.name not in self.FLOW_PRESERVING_TAG:
-            self.current_chunk_type = self.__get_element_type(element.name)
+    def save_current_chunk_if_valid(self):
+        # not correct; counts space added in handleText too
+        if self.current_text_parts is not None and self.current_text_length >= self.min_chunk_length:
+            data = self._fit_to_max_chars(" ".join(self.current_text_parts))
+            if data:
+                self._append_chunk(data, self.current_text_type)
+        self.current_text_parts = None
+
+    def _append_chunk(self, data, chunk_type):
+        self.chunks.append(Chunk(data, chunk_type))
+
+    def _fit_to_max_chars(self, data):
+        if self.max_chars is not None and self.number_of_chars + len(data) > self.max_chars:
+            data = data[:max(0, self.max_chars - self.number_of_chars)]
+            self.truncated = True
+        self.number_of_chars += len(data)
+        return data
+
+    def handle_start_tag(self, tag_name):  # TODO: what about one p after another closing p?
+        # TODO: https://developer.mozilla.org/de/docs/Web/HTML/Inline_elements
+        self.number_of_nodes += 1
+        if self.max_nodes is not None and self.number_of_nodes > self.max_nodes:
+            self.truncated = True
+        if tag_name not in self.flow_preserving_tags:
+            self.current_chunk_type = self.__get_element_type(tag_name)
+            self.save_current_chunk_if_valid()
+            return True
+        return False
 
     @staticmethod
     def __get_element_type(tag_name):
@@ -139,26 +695,78 @@ class ChunkHTMLParser(HTMLParser):
             current_element_type = Chunk.headline_type
         return current_element_type
 
-    def __handle_text(self, text):
-        if is_not_blank(text):
+    def handle_text(self, text):
+        if is_not_blank(text) and not self.truncated:
             text = text.strip()
-            if self.current_chunk is None:
-                self.current_chunk = Chunk(text, self.current_chunk_type)
+            if self.current_text_parts is None:
+                self.current_text_parts = [text]
+                self.current_text_length = len(text)
+                self.current_text_type = self.current_chunk_type
                 self.current_chunk_type = None
             else:
-                self.current_chunk.add_data(text)
+                self.current_text_parts.append(text)
+                self.current_text_length += len(text) + 1
 
-    def __handle_tag(self, tag): #TODO: what about one p after another closing p?
-        # TODO: https://developer.mozilla.org/de/docs/Web/HTML/Inline_elements
-        if tag.name not in self.FLOW_PRESERVING_TAG:
-            self.__save_current_chunk_if_valid()
-            return True
-        return False
+
+class _ChunkSpansBuilder(_ChunkBuilder):
+    # appends saved chunks to one buffer instead of creating Chunk objects
+
+    def __init__(self, flow_preserving_tags, min_chunk_length, max_nodes=None, max_chars=None):
+        super(_ChunkSpansBuilder, self).__init__(flow_preserving_tags, min_chunk_length, max_nodes, max_chars)
+        self.text_parts = []
+        self.text_length = -1
+        self.ends = array(ChunkSpans.OFFSET_TYPECODE)
+        self.type_codes = array(ChunkSpans.TYPE_TYPECODE)
+
+    def _append_chunk(self, data, chunk_type):
+        self.text_parts.append(data)
+        self.text_length += len(data) + 1
+        self.ends.append(self.text_length)
+        self.type_codes.append(ChunkSpans.CHUNK_TYPES.index(chunk_type))
+
+    def to_chunk_spans(self):
+        return ChunkSpans("\n".join(self.text_parts), self.ends, self.type_codes)
+
+
+class ChunkSpans:
+    """Chunks stored as one newline separated text with arrays of their end offsets and type codes."""
+
+    CHUNK_TYPES = (None, 'headline', 'list')
+    OFFSET_TYPECODE = 'L'
+    TYPE_TYPECODE = 'b'
+
+    def __init__(self, text="", ends=None, type_codes=None):
+        self.text = text
+        self.ends = ends if ends is not None else array(self.OFFSET_TYPECODE)
+        self.type_codes = type_codes if type_codes is not None else array(self.TYPE_TYPECODE)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        start, end, chunk_type = self.span(index)
+        return Chunk(self.text[start:end], chunk_type)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def span(self, index):
+        """Returns (start, end, chunk type) of the chunk at index."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        start = self.ends[index - 1] + 1 if index > 0 else 0
+        return start, self.ends[index], self.CHUNK_TYPES[self.type_codes[index]]
 
     def chunks_as_text(self):
-        if self.chunks:
-            return "\n".join([chunk.data for chunk in self.chunks])
-        return ""
+        return self.text
+
+    def to_chunks(self):
+        return list(self)
 
 
 class Chunk:
@@ -166,29 +774,130 @@ class Chunk:
     headline_type = 'headline'
     list_type = 'list'
 
+    __slots__ = ('_data', '_data_parts', 'chunk_type')
+
     def __init__(self, data, chunk_type=None):
-        self.data = data
+        self._data = data
+        # parts added with add_data are joined once when data is read
+        self._data_parts = None
         self.chunk_type = chunk_type
 
+    @property
+    def data(self):
+        # read once, so that concurrent readers cannot see the parts reset in between
+        data_parts = self._data_parts
+        if data_parts is not None:
+            self._data = " ".join(data_parts)
+            self._data_parts = None
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._data_parts = None
+
     def add_data(self, data):
-        self.data = "%s %s" % (self.data, data)
+        if self._data_parts is None:
+            self._data_parts = [self._data]
+        self._data_parts.append(data)
+
+    def __as_dict(self):
+        return {'data': self.data, 'chunk_type': self.chunk_type}
 
     def __repr__(self):
-        return str(self.__dict__)
+        return str(self.__as_dict())
 
     def __str__(self):
-        return str(self.__dict__)
+        return str(self.__as_dict())
 
     def __eq__(self, other):
-        return type(other) is type(self) and self.__dict__ == other.__dict__
+        return type(other) is type(self) and self.data == other.data and self.chunk_type == other.chunk_type
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
 
 def is_blank(input_string):
-    return input_string is None or input_string.strip() == ""
+    return input_string is None or not input_string.strip()
 
 
 def is_not_blank(input_string):
     return not is_blank(input_string)
+
+
+def detect_encoding(html_bytes, encoding_hint=None):
+    """Encoding from the byte order mark, encoding_hint or a meta charset, defaulting to utf-8."""
+    for byte_order_mark, encoding in BYTE_ORDER_MARKS:
+        if html_bytes.startswith(byte_order_mark):
+            return encoding
+    if encoding_hint:
+        charset_match = CHARSET_PARAMETER_PATTERN.search(encoding_hint)
+        encoding = _get_known_encoding(charset_match.group(1) if charset_match else encoding_hint.strip())
+        if encoding:
+            return encoding
+    prefix = html_bytes[:ENCODING_SNIFF_LENGTH]
+    declaration_match = XML_ENCODING_PATTERN.search(prefix) or META_CHARSET_PATTERN.search(prefix)
+    encoding = _get_known_encoding(declaration_match.group(1).decode('ascii')) if declaration_match else None
+    # a declaration that can be read as ascii cannot be utf-16
+    if encoding and encoding.startswith('utf-16'):
+        return 'utf-8'
+    return encoding or 'utf-8'
+
+
+def _get_known_encoding(label):
+    try:
+        encoding = codecs.lookup(label).name
+    except LookupError:
+        return None
+    if encoding in ('ascii', 'iso8859-1'):
+        return 'cp1252'
+    # python's codec names, but with dashes, which libxml2 knows as well
+    return encoding.replace('_', '-')
+
+
+def decode_html(html_bytes, encoding_hint=None):
+    html = html_bytes.decode(detect_encoding(html_bytes, encoding_hint), errors='replace')
+    return html[1:] if html.startswith('\ufeff') else html
+
+
+def truncate_html(html, max_length, encoding_hint=None):
+    """bytes are cut before a character that the cut would split."""
+    if not isinstance(html, bytes):
+        return html[:max_length]
+    decoder = codecs.getincrementaldecoder(detect_encoding(html, encoding_hint))(errors='replace')
+    html = html[:max_length]
+    decoder.decode(html)
+    # the bytes the decoder holds back are the start of the split character
+    pending_bytes, _ = decoder.getstate()
+    return html[:len(html) - len(pending_bytes)]
+
+
+def _parse_lxml_tree(html_input, encoding, parser_class):
+    if isinstance(html_input, bytes):
+        # the bytes are decoded by libxml2 unless it does not know the encoding or rejects the bytes
+        encoding = detect_encoding(html_input, encoding)
+        if encoding not in DECODED_BEFORE_LXML_ENCODINGS:
+            try:
+                return _feed_lxml_parser(parser_class(huge_tree=True, encoding=encoding), html_input)
+            except (LookupError, etree.XMLSyntaxError):
+                pass
+        html_input = decode_html(html_input, encoding)
+    return _feed_lxml_parser(parser_class(huge_tree=True), html_input)
+
+
+def _feed_lxml_parser(lxml_parser, html_input):
+    # feeding avoids lxml's refusal of str input with an xml encoding declaration
+    lxml_parser.feed(html_input)
+    return lxml_parser.close()
+
+
+def strip_raw_text_elements(html, keep_ld_json=False):
+    """Replaces script, style and svg elements by empty comments; self-closing ones are kept."""
+    if isinstance(html, bytes):
+        pattern, replacement, ld_json_type = RAW_TEXT_ELEMENT_BYTES_PATTERN, b"<!---->", b"ld+json"
+    else:
+        pattern, replacement, ld_json_type = RAW_TEXT_ELEMENT_STR_PATTERN, "<!---->", "ld+json"
+    if not keep_ld_json:
+        return pattern.sub(replacement, html)
+    return pattern.sub(lambda element_match: element_match.group(0) if ld_json_type in element_match.group(2).lower()
+                       else replacement, html)
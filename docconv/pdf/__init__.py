@@ -1,34 +1,450 @@
-from poppler import load_from_data
+import io
+import multiprocessing
+import os
+import queue
+import re
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from poppler import load_from_data, load_from_file, TextLayout
+
+from docconv.htmlchunks import Chunk
+
+PADDING_SPACES_PATTERN = re.compile(r"[ \t]{2,}")
+TRAILING_SPACES_PATTERN = re.compile(r"[ \t]+$", re.MULTILINE)
+EMPTY_LINES_PATTERN = re.compile(r"\n{3,}")
+
+# the document loaded by a worker of the page extraction pool
+_worker_pdf_document = None
+
+
+class _DefaultConverterMethod:
+    """Calls the method on a converter with the default options when it is called on the class."""
+
+    def __init__(self, method):
+        self.method = method
+        self.__doc__ = method.__doc__
+
+    def __get__(self, instance, owner):
+        return self.method.__get__(instance if instance is not None else owner(), owner)
 
 
 class Pdf2TextConverter:
 
+    PAGE_SEPARATOR = "\n\n"
+    TASKS_PER_WORKER = 4
+
+    HEADLINE_FONT_SIZE_RATIO = 1.2
+    PARAGRAPH_GAP_RATIO = 0.8
+
+    PHYSICAL_LAYOUT = 'physical'
+    RAW_ORDER_LAYOUT = 'raw'
+    COMPACT_LAYOUT = 'compact'
+
+    def __init__(self, parallel_workers=1, min_pages_for_parallel=100, first_page=1, last_page=None, max_pages=None,
+                 max_chars=None, scan_probe_pages=0, min_chars_per_text_page=20, layout_mode=PHYSICAL_LAYOUT):
+        """parallel_workers are processes, as the poppler binding holds the GIL."""
+        self.parallel_workers = parallel_workers
+        self.min_pages_for_parallel = min_pages_for_parallel
+        self.first_page = first_page
+        self.last_page = last_page
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.scan_probe_pages = scan_probe_pages
+        self.min_chars_per_text_page = min_chars_per_text_page
+        self.layout_mode = layout_mode
+
+    @_DefaultConverterMethod
+    def to_text(self, pdf_content, output=None):
+        """pdf_content may be bytes, a buffer or a path. With output, the text is written into it."""
+        pdf_source = self._to_pdf_source(pdf_content)
+        pdf_document = self._load(pdf_source)
+        start, stop = self._get_page_index_range(pdf_document.pages)
+        if self.scan_probe_pages > 0 and self._has_no_text_layer(pdf_document, start, stop):
+            return PdfResult("" if output is None else None,
+                             author=pdf_document.author.strip(),
+                             creation_date=pdf_document.creation_date,
+                             title=pdf_document.title.strip(),
+                             is_scanned=True)
+        pages = self._iter_document_pages(pdf_source, pdf_document, start, stop)
+        text_output = io.StringIO() if output is None else output
+        chars_truncated = self._write_pages(pages, text_output)
+
+        return PdfResult(text_output.getvalue() if output is None else None,
+                         author=pdf_document.author.strip(),
+                         creation_date=pdf_document.creation_date,
+                         title=pdf_document.title.strip(),
+                         truncated=chars_truncated or start > 0 or stop < pdf_document.pages)
+
+    def is_scanned(self, pdf_content):
+        pdf_document = self._load(self._to_pdf_source(pdf_content))
+        return self._has_no_text_layer(pdf_document, *self._get_page_index_range(pdf_document.pages))
+
+    def metadata(self, pdf_content):
+        pdf_document = self._load(self._to_pdf_source(pdf_content))
+        if pdf_document.is_locked():
+            return PdfMetadata(is_encrypted=True)
+        page_sizes = []
+        for page_index in range(0, pdf_document.pages):
+            page_rect = pdf_document.create_page(page_index).page_rect()
+            page_sizes.append((page_rect.width, page_rect.height))
+        return PdfMetadata(page_count=pdf_document.pages,
+                           author=pdf_document.author.strip(),
+                           creation_date=pdf_document.creation_date,
+                           title=pdf_document.title.strip(),
+                           is_encrypted=pdf_document.is_encrypted(),
+                           page_sizes=page_sizes)
+
+    def iter_pages(self, pdf_content):
+        pdf_source = self._to_pdf_source(pdf_content)
+        pdf_document = self._load(pdf_source)
+        yield from self._iter_document_pages(pdf_source, pdf_document, *self._get_page_index_range(pdf_document.pages))
+
+    def iter_chunks(self, pdf_content):
+        """Yields a Chunk per text block; blocks in a large font are headline chunks."""
+        pdf_document = self._load(self._to_pdf_source(pdf_content))
+        start, stop = self._get_page_index_range(pdf_document.pages)
+        for page_index in range(start, stop):
+            yield from self._get_page_chunks(pdf_document.create_page(page_index))
+
+    def _get_page_chunks(self, page):
+        text_list_option = getattr(page, 'TextListOption', None)
+        text_boxes = page.text_list(text_list_option.text_list_include_font) if text_list_option else page.text_list()
+        lines = self._get_text_lines(text_boxes, has_font_info=text_list_option is not None)
+        median_font_size = self._get_median_font_size(lines)
+        chunk_lines = []
+        for line in lines:
+            if chunk_lines and self._is_block_break(chunk_lines[-1], line):
+                yield self._to_chunk(chunk_lines, median_font_size)
+                chunk_lines = []
+            chunk_lines.append(line)
+        if chunk_lines:
+            yield self._to_chunk(chunk_lines, median_font_size)
+
     @staticmethod
-    def to_text(pdf_content):
+    def _get_text_lines(text_boxes, has_font_info):
+        lines = []
+        for text_box in text_boxes:
+            font_size = text_box.get_font_size() if has_font_info and text_box.has_font_info else None
+            if lines and lines[-1].is_on_same_line(text_box.bbox):
+                lines[-1].add(text_box.text, text_box.has_space_after)
+            else:
+                lines.append(_PdfTextLine(text_box.text, text_box.has_space_after, text_box.bbox, font_size))
+        return [line for line in lines if line.text]
+
+    def _is_block_break(self, previous_line, line):
+        return line.top - previous_line.bottom > previous_line.height * self.PARAGRAPH_GAP_RATIO \
+            or line.top < previous_line.top \
+            or line.font_size != previous_line.font_size
+
+    @staticmethod
+    def _get_median_font_size(lines):
+        font_sizes = sorted(line.font_size for line in lines if line.font_size)
+        return font_sizes[len(font_sizes) // 2] if font_sizes else None
+
+    def _to_chunk(self, lines, median_font_size):
+        chunk = Chunk(lines[0].text)
+        for line in lines[1:]:
+            chunk.add_data(line.text)
+        font_size = lines[0].font_size
+        if font_size and median_font_size and font_size >= median_font_size * self.HEADLINE_FONT_SIZE_RATIO:
+            chunk.chunk_type = Chunk.headline_type
+        return chunk
+
+    @staticmethod
+    def _to_pdf_source(pdf_content):
+        if isinstance(pdf_content, os.PathLike):
+            return Path(pdf_content)
+        if isinstance(pdf_content, bytes):
+            return pdf_content
         try:
-            pdf_document = load_from_data(pdf_content)
-            pages = []
+            with memoryview(pdf_content) as pdf_buffer:
+                return pdf_buffer.tobytes()
+        except TypeError:
+            return pdf_content
+
+    @staticmethod
+    def _load(pdf_source):
+        try:
+            return _load_document(pdf_source)
         except Exception as ex:
             raise PdfConversionError("Error occurred while loading pdf document (%s)" % str(ex.__class__.__name__))
 
-        for page_number in range(0, pdf_document.pages):
-            page = pdf_document.create_page(page_number)
-            pages.append(page.text())
+    def _get_page_index_range(self, page_count):
+        start = max(self.first_page - 1, 0)
+        stop = page_count if self.last_page is None else min(self.last_page, page_count)
+        if self.max_pages is not None:
+            stop = min(stop, start + self.max_pages)
+        return start, max(start, stop)
 
-        return PdfResult("\n\n".join(pages).strip(),
-                             author=pdf_document.author.strip(),
-                             creation_date=pdf_document.creation_date,
-                             title=pdf_document.title.strip())
+    def _has_no_text_layer(self, pdf_document, start, stop):
+        # without pages to probe there is no sign of a scan
+        if start == stop:
+            return False
+        for page_index in self._get_probe_page_indexes(start, stop, max(self.scan_probe_pages, 1)):
+            page_text = _extract_page_text(pdf_document.create_page(page_index), self.layout_mode)
+            if len("".join(page_text.split())) >= self.min_chars_per_text_page:
+                return False
+        return True
+
+    @staticmethod
+    def _get_probe_page_indexes(start, stop, number_of_probes):
+        page_count = stop - start
+        if page_count <= number_of_probes:
+            return list(range(start, stop))
+        return sorted({start + (probe * page_count) // number_of_probes for probe in range(number_of_probes)})
+
+    def _iter_document_pages(self, pdf_source, pdf_document, start, stop):
+        if self.parallel_workers > 1 and stop - start >= self.min_pages_for_parallel:
+            yield from self._iter_pages_in_parallel(pdf_source, start, stop)
+            return
+        for page_index in range(start, stop):
+            page = pdf_document.create_page(page_index)
+            yield PdfPage(page_index + 1, _extract_page_text(page, self.layout_mode))
+
+    def _iter_pages_in_parallel(self, pdf_source, start, stop):
+        page_ranges = self._split_page_range(start, stop, self.parallel_workers * self.TASKS_PER_WORKER)
+        # the document is sent to and loaded by each worker once, the tasks only carry their page range. Workers are
+        # spawned like those of PdfConversionPool, as forking a process with several threads can deadlock
+        with ProcessPoolExecutor(max_workers=self.parallel_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_load_worker_document, initargs=(pdf_source,)) as executor:
+            futures = [executor.submit(_extract_page_texts, range_start, range_stop, self.layout_mode)
+                       for range_start, range_stop in page_ranges]
+            try:
+                for (range_start, _), future in zip(page_ranges, futures):
+                    for offset, text in enumerate(future.result()):
+                        yield PdfPage(range_start + offset + 1, text)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    @staticmethod
+    def _split_page_range(start, stop, number_of_ranges):
+        range_size, remainder = divmod(stop - start, number_of_ranges)
+        page_ranges = []
+        range_start = start
+        for range_index in range(number_of_ranges):
+            range_stop = range_start + range_size + (1 if range_index < remainder else 0)
+            if range_stop > range_start:
+                page_ranges.append((range_start, range_stop))
+            range_start = range_stop
+        return page_ranges
+
+    def _write_pages(self, pages, output):
+        # writes the same text as stripping the joined pages, holding back whitespace until more text follows.
+        # returns whether the text was cut because of max_chars
+        pending_whitespace = ""
+        text_written = False
+        remaining_chars = self.max_chars
+        for page in pages:
+            part = pending_whitespace + self.PAGE_SEPARATOR + page.text if text_written else page.text.lstrip()
+            stripped_part = part.rstrip()
+            if stripped_part:
+                if remaining_chars is not None:
+                    if len(stripped_part) > remaining_chars:
+                        output.write(stripped_part[:remaining_chars])
+                        return True
+                    remaining_chars -= len(stripped_part)
+                output.write(stripped_part)
+                text_written = True
+                pending_whitespace = part[len(stripped_part):]
+            elif text_written:
+                pending_whitespace = part
+        return False
+
+
+def _load_document(pdf_source):
+    if isinstance(pdf_source, Path):
+        return load_from_file(str(pdf_source))
+    return load_from_data(pdf_source)
+
+
+def _load_worker_document(pdf_source):
+    global _worker_pdf_document
+    _worker_pdf_document = _load_document(pdf_source)
+
+
+def _extract_page_texts(start, stop, layout_mode):
+    return [_extract_page_text(_worker_pdf_document.create_page(page_index), layout_mode)
+            for page_index in range(start, stop)]
+
+
+def _extract_page_text(page, layout_mode):
+    if layout_mode == Pdf2TextConverter.RAW_ORDER_LAYOUT:
+        return page.text(layout_mode=TextLayout.raw_order_layout)
+    text = page.text()
+    if layout_mode == Pdf2TextConverter.COMPACT_LAYOUT:
+        text = PADDING_SPACES_PATTERN.sub(" ", text)
+        text = TRAILING_SPACES_PATTERN.sub("", text)
+        text = EMPTY_LINES_PATTERN.sub("\n\n", text)
+    return text
+
+
+class _PdfTextLine:
+
+    def __init__(self, text, has_space_after, bbox, font_size):
+        self.words = []
+        self.top = bbox.y
+        self.height = bbox.height
+        self.font_size = font_size
+        self.add(text, has_space_after)
+
+    def add(self, text, has_space_after):
+        self.words.append(text + " " if has_space_after else text)
+
+    def is_on_same_line(self, bbox):
+        return abs(bbox.y - self.top) < max(bbox.height, self.height) / 2
+
+    @property
+    def bottom(self):
+        return self.top + self.height
+
+    @property
+    def text(self):
+        return "".join(self.words).strip()
+
+
+class PdfConversionPool:
+
+    def __init__(self, converter=None, workers=2, timeout=60, max_memory=None, max_documents_per_worker=100):
+        """Workers are replaced after a timeout, a crash or exceeding max_memory."""
+        self.converter = converter if converter is not None else Pdf2TextConverter()
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.max_documents_per_worker = max_documents_per_worker
+        self._idle_workers = queue.Queue()
+        self._number_of_workers = workers
+        for _ in range(workers):
+            self._idle_workers.put(None)
+
+    def to_text(self, pdf_content):
+        pdf_source = self.converter._to_pdf_source(pdf_content)
+        worker = self._idle_workers.get()
+        try:
+            if worker is not None and (worker.documents_converted >= self.max_documents_per_worker
+                                       or not worker.is_alive()):
+                worker.stop()
+                worker = None
+            if worker is None:
+                worker = _PdfWorker(self.converter, self.max_memory)
+            return worker.to_text(pdf_source, self.timeout)
+        except PdfWorkerError:
+            worker.stop()
+            worker = None
+            raise
+        finally:
+            self._idle_workers.put(worker)
+
+    def close(self):
+        for _ in range(self._number_of_workers):
+            worker = self._idle_workers.get()
+            if worker is not None:
+                worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _PdfWorker:
+
+    def __init__(self, converter, max_memory):
+        # spawned instead of forked: forking a process with several threads can deadlock, and a forked worker would
+        # count the inherited address space of the parent against max_memory
+        context = multiprocessing.get_context('spawn')
+        self._connection, worker_connection = context.Pipe()
+        self._process = context.Process(target=_run_pdf_worker,
+                                        args=(worker_connection, converter, max_memory), daemon=True)
+        self._process.start()
+        worker_connection.close()
+        self.documents_converted = 0
+
+    def to_text(self, pdf_source, timeout):
+        self.documents_converted += 1
+        try:
+            self._connection.send(pdf_source)
+            if not self._connection.poll(timeout):
+                raise PdfWorkerError("Pdf conversion timed out after %s seconds" % timeout)
+            is_successful, value = self._connection.recv()
+        except (EOFError, OSError):
+            raise PdfWorkerError("Pdf conversion worker died (exit code %s)" % self.__wait_for_exit_code())
+        if not is_successful:
+            raise value
+        return value
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def stop(self):
+        self._connection.close()
+        self._process.terminate()
+        self._process.join()
+
+    def __wait_for_exit_code(self):
+        self._process.join(1)
+        return self._process.exitcode
+
+
+def _run_pdf_worker(connection, converter, max_memory):
+    if max_memory:
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+    while True:
+        try:
+            pdf_source = connection.recv()
+        except EOFError:
+            return
+        try:
+            connection.send((True, converter.to_text(pdf_source)))
+        except PdfConversionError as ex:
+            connection.send((False, ex))
+        except MemoryError:
+            connection.send((False, PdfWorkerError("Pdf conversion exceeded the memory limit of %s bytes"
+                                                   % max_memory)))
+        except Exception as ex:
+            connection.send((False, PdfConversionError("Error occurred while converting pdf document (%s)"
+                                                       % str(ex.__class__.__name__))))
+
+
+class PdfPage:
+
+    def __init__(self, page_number, text):
+        self.page_number = page_number
+        self.text = text
+
+    @property
+    def char_count(self):
+        return len(self.text)
 
 
 class PdfResult:
 
-    def __init__(self, text, author=None, creation_date=None, title=None):
+    def __init__(self, text, author=None, creation_date=None, title=None, truncated=False, is_scanned=False):
         self.text = text
         self.author = author
         self.creation_date = creation_date
         self.title = title
+        self.truncated = truncated
+        self.is_scanned = is_scanned
+
+
+class PdfMetadata:
+
+    def __init__(self, page_count=None, author=None, creation_date=None, title=None, is_encrypted=False,
+                 page_sizes=None):
+        self.page_count = page_count
+        self.author = author
+        self.creation_date = creation_date
+        self.title = title
+        self.is_encrypted = is_encrypted
+        self.page_sizes = page_sizes if page_sizes is not None else []
 
 
 class PdfConversionError(Exception):
     pass
+
+
+class PdfWorkerError(PdfConversionError):
+    pass
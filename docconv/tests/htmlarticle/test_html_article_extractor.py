@@ -1,10 +1,13 @@
+import copy
 import os
 import datetime
+import types
 
 import pytest
 from dateutil.tz import tzutc, tzoffset
 from lxml import etree
-from htmlarticle import HtmlArticleExtractor
+from docconv.htmlarticle import HtmlArticleExtractor
+from docconv.htmlchunks import ChunkHTMLParser, HtmlDocument, LXML_NATIVE_BACKEND
 
 SOURCE_URL = 'http://foo.de'
 
@@ -43,6 +46,122 @@ class TestHtmlArticleExtractor:
         assert article.publication_date is None
         assert article.image_urls == []
 
+    def test_html_as_bytes(self):
+        for resource in ['valid_article.html', 'image_in_article.html',
+                         'authors_and_keyword_in_span_before_top_node.html']:
+            with open(get_test_resource(resource), 'rb') as file:
+                html = file.read()
+                article = self.extractor.extract(html, SOURCE_URL)
+                expected_article = self.extractor.extract(html.decode('utf-8'), SOURCE_URL)
+                assert vars(article) == vars(expected_article)
+
+    def test_html_as_bytes_in_declared_encoding(self):
+        html = "<html><head><meta charset='iso-8859-15'><title>Grüße €</title></head><body></body></html>"
+        assert self.extractor.extract(html.encode('iso-8859-15'), SOURCE_URL).title == "Grüße €"
+        assert self.extractor.extract(html.encode('utf-8'), SOURCE_URL, encoding='utf-8').title == "Grüße €"
+
+    def test_html_as_bytes_with_undecodable_byte(self):
+        with open(get_test_resource('valid_article.html'), 'r') as file:
+            html = file.read()
+        expected_article = self.extractor.extract(html, SOURCE_URL)
+        html_bytes = html.encode('windows-1252', errors='replace')
+        first_paragraph_start = html_bytes.find(b"<p")
+        html_bytes = html_bytes[:first_paragraph_start] + b"\x9d" + html_bytes[first_paragraph_start:]
+        article = self.extractor.extract(html_bytes, SOURCE_URL, encoding='windows-1252')
+        assert article.text == expected_article.text
+        assert article.authors == expected_article.authors
+
+    def test_html_document(self):
+        resources_dir = os.path.join(os.path.dirname(__file__), 'resources')
+        for resource in sorted(os.listdir(resources_dir)):
+            with open(os.path.join(resources_dir, resource), 'r') as file:
+                html = file.read()
+                html_document = HtmlDocument(html)
+                article = self.extractor.extract(html_document, SOURCE_URL)
+                assert vars(article) == vars(self.extractor.extract(html, SOURCE_URL))
+                # the shared tree is not modified by the extraction
+                assert ChunkHTMLParser().to_chunks(html_document) \
+                       == ChunkHTMLParser(parser_backend=LXML_NATIVE_BACKEND).to_chunks(html)
+
+    def test_document_is_not_deep_copied(self, monkeypatch):
+        with open(get_test_resource('authors_in_div_with_authors_class_before_top_node.html'), 'r') as file:
+            html = file.read()
+            expected_article = self.extractor.extract(html, SOURCE_URL)
+
+            deepcopy = copy.deepcopy
+
+            def deepcopy_of_subtrees_only(node, *args):
+                # newspaper's cleaner copies single nodes itself
+                assert getattr(node, 'tag', None) != 'html'
+                return deepcopy(node, *args)
+            monkeypatch.setattr(copy, 'deepcopy', deepcopy_of_subtrees_only)
+            article = self.extractor.extract(html, SOURCE_URL)
+            assert expected_article.authors
+            assert vars(article) == vars(expected_article)
+            assert vars(self.extractor.extract(HtmlDocument(html), SOURCE_URL)) == vars(expected_article)
+
+    def test_parsing_stops_after_end_of_node(self):
+        html = "<html><body><div class='a'><p>x</p></div>%s</body></html>" % ("<p>y</p>" * 100000)
+
+        class FirstDiv:
+            @staticmethod
+            def matches(node):
+                return node.tag == 'div'
+        doc = self.extractor.parse_html(types.SimpleNamespace(html=html), until_end_of=FirstDiv())
+        assert doc.find('body/div/p').text == 'x'
+        assert len(doc.find('body')) < 100000
+
+    def test_blank_html_document(self):
+        assert self.extractor.extract(HtmlDocument(" "), SOURCE_URL).text == ""
+
+    def test_limits_not_hit(self):
+        with open(get_test_resource('valid_article.html'), 'r') as file:
+            html = file.read()
+            article = HtmlArticleExtractor(max_input_length=len(html), max_nodes=100000,
+                                           max_chars=1000000).extract(html, SOURCE_URL)
+            assert not article.truncated
+            assert vars(article) == vars(self.extractor.extract(html, SOURCE_URL))
+
+    def test_max_chars(self):
+        with open(get_test_resource('valid_article.html'), 'r') as file:
+            html = file.read()
+            article = HtmlArticleExtractor(max_chars=100).extract(html, SOURCE_URL)
+            assert article.truncated
+            assert article.text == self.extractor.extract(html, SOURCE_URL).text[:100]
+
+    def test_max_input_length_and_max_nodes(self):
+        sentence = "This is one of the sentences that are in the text of the article and it has a number. "
+        paragraphs = "".join("<p>%s %d</p>" % (sentence * 5, i) for i in range(20))
+        html = "<html><head><title>foo</title></head><body><div>%s</div></body></html>" % paragraphs
+        for extractor in [HtmlArticleExtractor(max_input_length=html.index(" 10</p>")),
+                          HtmlArticleExtractor(max_nodes=15)]:
+            article = extractor.extract(html, SOURCE_URL)
+            assert article.truncated
+            assert article.title == "foo"
+            assert " 9" in article.text and " 10" not in article.text
+
+    def test_max_nodes_of_html_document(self):
+        sentence = "This is one of the sentences that are in the text of the article and it has a number. "
+        paragraphs = "".join("<p>%s %d</p>" % (sentence * 5, i) for i in range(20))
+        html = "<html><head><title>foo</title></head><body><div>%s</div></body></html>" % paragraphs
+        extractor = HtmlArticleExtractor(max_nodes=15)
+        article = extractor.extract(HtmlDocument(html), SOURCE_URL)
+        assert article.truncated
+        assert " 9" in article.text and " 10" not in article.text
+        assert vars(article) == vars(extractor.extract(html, SOURCE_URL))
+
+    def test_max_nodes_drops_tails_after_cut(self):
+        html = "<html><body><div><p>a</p><p>b</p></div>tail</body></html>"
+        doc = etree.fromstring(html, etree.HTMLParser())
+        assert HtmlArticleExtractor(max_nodes=4).remove_elements_after_max_nodes(doc)
+        assert etree.tostring(doc) == b"<html><body><div><p>a</p></div></body></html>"
+
+    def test_max_input_length_of_bytes_does_not_split_characters(self):
+        html = "<html><head><title>Grüße aus München</title></head><body><p>Café</p></body></html>".encode('utf-8')
+        article = HtmlArticleExtractor(max_input_length=html.index(b"\xa9")).extract(html, SOURCE_URL)
+        assert article.truncated
+        assert article.title == "Grüße aus München"
+
     def test_html_article_text_is_extracted_and_stripped(self):
         with open(get_test_resource('valid_article.html'), 'r') as file:
             html = file.read()
@@ -652,6 +771,29 @@ class TestHtmlArticleExtractor:
         assert article.publication_date == datetime.datetime(2021, 7, 12, 12, 31, tzinfo=tzutc())
         assert article.publication_date_display == 'July 12, 2021'
 
+    def test_ld_json_scripts_are_kept_when_pre_stripping(self):
+        html = '''<html><head><script>var x = "<p>";</script><style>p {}</style>
+                        <script type="application/ld+json"> {"datePublished": "2021-07-12T12:31:00Z"} </script>
+                        </head><body><svg><text>svg</text></svg></body></html>'''
+        article = HtmlArticleExtractor(pre_strip_raw_text_elements=True).extract(html, SOURCE_URL)
+        assert article.publication_date == datetime.datetime(2021, 7, 12, 12, 31, tzinfo=tzutc())
+
+    def test_pre_stripping_keeps_text_after_self_closing_svg(self):
+        sentence = "This is one of the sentences that are in the text of the article and it has a number. "
+        html = '<html><body><div><p>Share <svg class="icon"/> this %s</p><p>%s 1</p><p>%s 2</p><svg><path/></svg>' \
+               '<p>End</p></div></body></html>' % (sentence * 3, sentence * 5, sentence * 5)
+        article = HtmlArticleExtractor(pre_strip_raw_text_elements=True).extract(html, SOURCE_URL)
+        assert article.text == self.extractor.extract(html, SOURCE_URL).text
+        assert "number. 2" in article.text
+
+    def test_pre_stripping_keeps_results_of_resources(self):
+        extractor = HtmlArticleExtractor(pre_strip_raw_text_elements=True)
+        resources_dir = os.path.join(os.path.dirname(__file__), 'resources')
+        for resource in sorted(os.listdir(resources_dir)):
+            with open(os.path.join(resources_dir, resource), 'r') as file:
+                html = file.read()
+                assert vars(extractor.extract(html, SOURCE_URL)) == vars(self.extractor.extract(html, SOURCE_URL))
+
     def test_publish_date_not_found_in_ld_json_script(self):
         html = '''<html><head>
                         <script type="application/ld+json"> {"@context": "http:\/\/schema.org", "@type": "NewsArticle",
@@ -1,4 +1,4 @@
-from htmlchunks import Chunk, ArticleChunksExtractor
+from docconv.htmlchunks import Chunk, ArticleChunksExtractor
 
 
 class TestArticleChunksExtractor:
@@ -61,3 +61,30 @@ class TestArticleChunksExtractor:
     def test_default_for_min_paragraph_length(self):
         chunks = [Chunk("b" * 199), Chunk("a"), Chunk("b" * 200)]
         assert ArticleChunksExtractor().extract(chunks) == [Chunk("b" * 200)]
+
+    def test_iter_extract_equals_extract(self):
+        headline = Chunk("a", chunk_type=Chunk.headline_type)
+        for chunks in [[], [headline, Chunk("b" * 5)], [Chunk("a" * 5), Chunk("b" * 11)],
+                       [headline, Chunk("a"), Chunk("a"), Chunk("a"), Chunk("a"), Chunk("a"), Chunk("b" * 11)],
+                       [headline, Chunk("a"), Chunk("a"), Chunk("a"), Chunk("a"), Chunk("b" * 11)],
+                       [Chunk("c"), headline, Chunk("a"), headline, Chunk("b" * 11, chunk_type=Chunk.headline_type)],
+                       [Chunk("b" * 11), headline, Chunk("a"), Chunk("b" * 11)]]:
+            assert list(self.extractor.iter_extract(iter(chunks), all_chunks_if_no_paragraph=True)) \
+                   == self.extractor.extract(chunks)
+
+    def test_iter_extract_yields_article_chunks_before_reading_further(self):
+        read_chunks = []
+
+        def chunks():
+            for chunk in [Chunk("a"), Chunk("a", chunk_type=Chunk.headline_type), Chunk("b" * 11), Chunk("c")]:
+                read_chunks.append(chunk)
+                yield chunk
+        article_chunks = self.extractor.iter_extract(chunks())
+        assert next(article_chunks) == Chunk("a", chunk_type=Chunk.headline_type)
+        assert next(article_chunks) == Chunk("b" * 11)
+        assert len(read_chunks) == 3
+
+    def test_iter_extract_yields_nothing_without_paragraph(self):
+        chunks = [Chunk("a", chunk_type=Chunk.headline_type), Chunk("b" * 5)]
+        assert list(self.extractor.iter_extract(chunks)) == []
+        assert list(self.extractor.iter_extract(chunks + [Chunk("b" * 11)])) == chunks + [Chunk("b" * 11)]
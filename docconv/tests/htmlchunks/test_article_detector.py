@@ -1,4 +1,4 @@
-from htmlchunks import Chunk, ArticleDetector
+from docconv.htmlchunks import Chunk, ArticleDetector, Html2TextChunksConverter
 
 
 class TestArticleDetector:
@@ -31,3 +31,33 @@ class TestArticleDetector:
     def test_min_chunk_length_default(self):
         assert ArticleDetector(min_article_length=1).is_article([Chunk("b" * 50)])
         assert not ArticleDetector(min_article_length=1).is_article([Chunk("b" * 49)])
+
+    def test_chunks_are_consumed_only_until_decided(self):
+        consumed_chunks = []
+
+        def chunks():
+            for chunk in [Chunk("buz"), Chunk("baz"), Chunk("bla")]:
+                consumed_chunks.append(chunk)
+                yield chunk
+        assert ArticleDetector(min_article_length=5, min_chunk_length=2).is_article(chunks())
+        assert consumed_chunks == [Chunk("buz"), Chunk("baz")]
+
+    def test_is_article_html(self):
+        paragraph = "<p>%s</p>" % ("b" * 60)
+        detector = ArticleDetector(min_article_length=100)
+        assert detector.is_article_html("<html><body>%s</body></html>" % (paragraph * 2))
+        assert not detector.is_article_html("<html><body>%s<p>short</p></body></html>" % paragraph)
+        assert not detector.is_article_html("<html><body><nav>%s</nav>%s</body></html>" % (paragraph, paragraph),
+                                            custom_tags_to_remove=['nav'])
+        assert not detector.is_article_html(None)
+
+    def test_html_parts_are_read_only_until_decided(self):
+        read_parts = []
+
+        def html_parts():
+            for html_part in ["<html><body><p>%s</p>" % ("b" * 60)] * 5 + ["</body></html>"]:
+                read_parts.append(html_part)
+                yield html_part
+        chunks = Html2TextChunksConverter.iter_text_chunks(html_parts(), min_chunk_length=50)
+        assert ArticleDetector(min_article_length=100).is_article(chunks)
+        assert len(read_parts) == 2
@@ -1,5 +1,15 @@
 import os
-from htmlchunks import HTMLParser, ChunkHTMLParser, Chunk, Html2TextChunksConverter
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from docconv.htmlchunks import HTMLParser, ChunkHTMLParser, Chunk, Html2TextChunksConverter, \
+    StreamingChunkHTMLParser, RemovalRules, ChunkingResult, BoilerplateIndex, HtmlDocument, detect_encoding, \
+    strip_raw_text_elements, truncate_html
+from docconv.htmlchunks import HTML_PARSER_BACKEND, LXML_BACKEND, HTML5LIB_BACKEND, LXML_NATIVE_BACKEND
+
+RESOURCES = ['energiesparen.html', 'headlines.html', 'ideenplanet_impressum.html', 'provinzial.html',
+             'versicherung.html']
 
 
 class TestHtml2TextConverter:
@@ -11,6 +21,178 @@ class TestHtml2TextConverter:
             assert len(text_chunks) == 223
             assert text_chunks[0].data == "Hausbau"
 
+    def test_lxml_backends_produce_same_chunks(self):
+        for resource in RESOURCES:
+            with open(os.path.join(os.path.dirname(__file__), 'resources', resource)) as f:
+                content = f.read()
+                expected_chunks = Html2TextChunksConverter.to_text_chunks(content)
+                for parser_backend in [LXML_BACKEND, LXML_NATIVE_BACKEND]:
+                    assert Html2TextChunksConverter.to_text_chunks(content, parser_backend=parser_backend) \
+                           == expected_chunks
+
+    def test_html5lib_backend(self):
+        pytest.importorskip('html5lib')
+        with open(os.path.join(os.path.dirname(__file__), 'resources', 'energiesparen.html')) as f:
+            content = f.read()
+            assert Html2TextChunksConverter.to_text_chunks(content, parser_backend=HTML5LIB_BACKEND) \
+                   == Html2TextChunksConverter.to_text_chunks(content)
+
+    def test_batch_text_chunks(self):
+        contents = []
+        for resource in RESOURCES:
+            with open(os.path.join(os.path.dirname(__file__), 'resources', resource)) as f:
+                contents.append(f.read())
+        contents = contents * 3
+        expected_chunks = [Html2TextChunksConverter.to_text_chunks(content) for content in contents]
+        for workers in [1, 2]:
+            results = list(Html2TextChunksConverter.iter_batch_text_chunks(iter(contents), workers=workers,
+                                                                           chunksize=2))
+            assert [result.index for result in results] == list(range(len(contents)))
+            assert [result.chunks for result in results] == expected_chunks
+        results = Html2TextChunksConverter.iter_batch_text_chunks(contents, workers=2, chunksize=1, ordered=False)
+        assert sorted(((result.index, result.chunks) for result in results), key=lambda result: result[0]) \
+               == list(enumerate(expected_chunks))
+
+    def test_batch_text_chunks_with_errors(self):
+        for workers in [1, 2]:
+            results = list(Html2TextChunksConverter.iter_batch_text_chunks(
+                ["<body><p>foo</p></body>", 42, "<body><p>bar</p></body>"], workers=workers,
+                custom_tags_to_remove=['nav']))
+            assert [result.chunks for result in results] == [[Chunk("foo")], None, [Chunk("bar")]]
+            assert isinstance(results[1], ChunkingResult) and isinstance(results[1].error, AttributeError)
+            assert results[0].error is None
+
+    def test_empty_batch(self):
+        assert list(Html2TextChunksConverter.iter_batch_text_chunks([], workers=2)) == []
+
+    def test_bytes_are_chunked_in_their_encoding(self):
+        html = "<html><head><meta charset='iso-8859-15'></head><body><p>Grüße €</p></body></html>"
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+            assert Html2TextChunksConverter.to_text_chunks(html.encode('iso-8859-15'), parser_backend=parser_backend) \
+                   == [Chunk("Grüße €")]
+            assert Html2TextChunksConverter.to_text_chunks(html.encode('utf-8'), parser_backend=parser_backend,
+                                                           encoding='text/html; charset=UTF-8') \
+                   == [Chunk("Grüße €")]
+            assert Html2TextChunksConverter.to_text_chunks(b"  ", parser_backend=parser_backend) == []
+
+    def test_bytes_with_undecodable_bytes(self):
+        utf8_html = "<html><body><p>Grüße aus München ?</p></body></html>".encode('utf-8').replace(b"?", b"\xff")
+        windows_1252_html = b"<html><head><meta charset='iso-8859-1'></head>" \
+                            b"<body><p>Gr\xfc\xdfe \x9d aus</p></body></html>"
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_BACKEND, HTML5LIB_BACKEND, LXML_NATIVE_BACKEND]:
+            assert Html2TextChunksConverter.to_text_chunks(utf8_html, parser_backend=parser_backend) \
+                   == [Chunk("Grüße aus München \ufffd")]
+            assert Html2TextChunksConverter.to_text_chunks(windows_1252_html, parser_backend=parser_backend) \
+                   == [Chunk("Grüße \ufffd aus")]
+            assert Html2TextChunksConverter.to_text_chunks(windows_1252_html, parser_backend=parser_backend,
+                                                           encoding='windows-1252') == [Chunk("Grüße \ufffd aus")]
+        assert Html2TextChunksConverter.to_text_chunks(HtmlDocument(windows_1252_html)) == [Chunk("Grüße \ufffd aus")]
+
+    def test_fixtures_as_bytes(self):
+        for resource in RESOURCES:
+            with open(os.path.join(os.path.dirname(__file__), 'resources', resource), 'rb') as f:
+                content = f.read()
+                assert Html2TextChunksConverter.to_text_chunks(content, parser_backend=LXML_NATIVE_BACKEND) \
+                       == Html2TextChunksConverter.to_text_chunks(content.decode('utf-8'))
+
+
+class TestHtmlDocument:
+
+    def test_tree_is_parsed_once(self):
+        html_document = HtmlDocument("<html><body><p>foo</p></body></html>")
+        assert html_document.tree is html_document.tree
+        assert html_document.body.find('p').sourceline == 1
+
+    def test_blank_document(self):
+        assert HtmlDocument(" ").tree is None
+        assert HtmlDocument(None).body is None
+        assert Html2TextChunksConverter.to_text_chunks(HtmlDocument(" ")) == []
+
+    def test_chunks_of_document_equal_chunks_of_html(self):
+        for resource in RESOURCES:
+            with open(os.path.join(os.path.dirname(__file__), 'resources', resource), 'rb') as f:
+                content = f.read()
+                html_document = HtmlDocument(content)
+                expected_chunks = Html2TextChunksConverter.to_text_chunks(content, parser_backend=LXML_NATIVE_BACKEND)
+                for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+                    assert Html2TextChunksConverter.to_text_chunks(html_document, parser_backend=parser_backend) \
+                           == expected_chunks
+                assert Html2TextChunksConverter.to_chunk_spans(html_document).to_chunks() == expected_chunks
+
+    def test_pre_stripped_document_keeps_ld_json(self):
+        html_document = HtmlDocument("<html><head><script type='application/ld+json'>{}</script><script>x</script>"
+                                     "</head><body><p>foo</p></body></html>", pre_strip_raw_text_elements=True)
+        assert [script.text for script in html_document.tree.iter('script')] == ["{}"]
+        assert Html2TextChunksConverter.to_text_chunks(html_document) == [Chunk("foo")]
+
+
+class TestStripRawTextElements:
+
+    def test_elements_are_replaced_by_empty_comments(self):
+        html = "<p>foo<script type='text/javascript'>if (a<b) document.write('</p>')</script>bar<STYLE>p {}</STYLE>" \
+               "<svg viewBox='0 0 1 1'><text>x</text></svg><scripts>baz</scripts></p>"
+        assert strip_raw_text_elements(html) == "<p>foo<!---->bar<!----><!----><scripts>baz</scripts></p>"
+        assert strip_raw_text_elements(html.encode()) == strip_raw_text_elements(html).encode()
+
+    def test_ld_json_scripts_can_be_kept(self):
+        html = '<script type="application/ld+json">{}</script><script>x</script>'
+        assert strip_raw_text_elements(html, keep_ld_json=True) \
+               == '<script type="application/ld+json">{}</script><!---->'
+        assert strip_raw_text_elements(html) == '<!----><!---->'
+
+    def test_self_closing_elements_are_kept(self):
+        html = '<p>Share <svg class="icon"/> this</p><script src="a.js"/><p>Important</p><svg><path/></svg><p>End</p>'
+        assert strip_raw_text_elements(html) == '<p>Share <svg class="icon"/> this</p><script src="a.js"/>' \
+                                                '<p>Important</p><!----><p>End</p>'
+        assert strip_raw_text_elements(html.encode()) == strip_raw_text_elements(html).encode()
+
+    def test_chunks_with_self_closing_elements_are_kept(self):
+        html = '<html><body><p>Share <svg class="icon"/> this</p><p>Important text</p><p>More text</p>' \
+               '<svg><text>x</text></svg><p>End</p><script src="a.js"/><p>After script</p></body></html>'
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_BACKEND, LXML_NATIVE_BACKEND]:
+            parser = ChunkHTMLParser(parser_backend=parser_backend, pre_strip_raw_text_elements=True)
+            # only the text of the svg element with an end tag is lost
+            assert parser.to_chunks(html) == [chunk for chunk in ChunkHTMLParser(parser_backend=parser_backend)
+                                              .to_chunks(html) if chunk.data != "x"]
+
+    def test_chunks_of_fixtures_are_kept(self):
+        for resource in RESOURCES:
+            with open(os.path.join(os.path.dirname(__file__), 'resources', resource)) as f:
+                content = f.read()
+                for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+                    parser = ChunkHTMLParser(parser_backend=parser_backend, pre_strip_raw_text_elements=True)
+                    assert parser.to_chunks(content) \
+                           == ChunkHTMLParser(parser_backend=parser_backend).to_chunks(content)
+
+    def test_text_around_stripped_elements_is_separated_as_before(self):
+        html = "<html><body><p>foo <script>x</script> bar<b>baz</b><style>y</style>bla</p></body></html>"
+        parser = ChunkHTMLParser(pre_strip_raw_text_elements=True)
+        assert parser.to_chunks(html) == ChunkHTMLParser().to_chunks(html) == [Chunk("foo bar baz bla")]
+
+
+class TestDetectEncoding:
+
+    def test_byte_order_mark_wins(self):
+        assert detect_encoding(b"\xef\xbb\xbf<meta charset=latin-1>", "shift_jis") == 'utf-8'
+        assert detect_encoding(b"\xff\xfe<\x00", None) == 'utf-16-le'
+
+    def test_hint_before_declaration(self):
+        assert detect_encoding(b"<meta charset=latin-1>", "text/html; charset=\"Shift_JIS\"") == 'shift-jis'
+        assert detect_encoding(b"<meta charset=latin-1>", "euc-kr") == 'euc-kr'
+        assert detect_encoding(b"<meta charset=koi8-r>", "text/html") == 'koi8-r'
+        assert detect_encoding(b"<meta charset=koi8-r>", "unknown-charset") == 'koi8-r'
+
+    def test_declarations(self):
+        assert detect_encoding(b'<head><meta http-equiv="Content-Type" content="text/html; charset=ISO-8859-2">') \
+               == 'iso8859-2'
+        assert detect_encoding(b"<?xml version='1.0' encoding='windows-1251'?><html>") == 'cp1251'
+        assert detect_encoding(b"<meta charset=utf-16>") == 'utf-8'
+        assert detect_encoding(b"<meta charset=ascii>") == 'cp1252'
+
+    def test_default_and_bounded_sniffing(self):
+        assert detect_encoding(b"<html><body>foo</body></html>") == 'utf-8'
+        assert detect_encoding(b" " * 5000 + b"<meta charset=koi8-r>") == 'utf-8'
+
 
 class TestChunkHTMLParser:
 
@@ -165,6 +347,25 @@ class TestChunkHTMLParser:
             assert actualChunks[0].data.startswith("Privat-Haft")
             assert actualChunks[-1].data == "Schaden melden"
 
+    def test_deeply_nested_tags(self):
+        depth = 5000
+        self.parser.parse("<html><body>%s<p>foo</p>%s</body></html>" % ("<div>a<b>b</b>" * depth, "</div>" * depth))
+        assert len(self.parser.chunks) == depth + 1
+        assert self.parser.chunks[0] == Chunk("a b")
+        assert self.parser.chunks[-1] == Chunk("foo")
+
+    def test_selectors_to_remove(self):
+        html = "<html><body><div class='cookie-banner x'><p>cookies</p></div><div id=nav>menu</div>" \
+               "<p role=navigation>links</p><p data-ad='top-ad-1'>ad</p><p hidden>hidden</p><span class=x>foo</span>" \
+               "<div class=cookie-banner-text>bar</div></body></html>"
+        selectors = ['div.cookie-banner', '#nav', '[role=navigation]', 'p[data-ad*=ad-]', '[hidden]']
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+            assert Html2TextChunksConverter.to_text_chunks(html, selectors_to_remove=selectors,
+                                                           parser_backend=parser_backend) \
+                   == [Chunk("foo"), Chunk("bar")]
+        assert list(Html2TextChunksConverter.iter_text_chunks([html], selectors_to_remove=selectors)) \
+               == [Chunk("foo"), Chunk("bar")]
+
     def test_get_chunks_as_string(self):
         self.parser.parse("<html><body><p>foo<u>bla</u></p><br>bar</body></html>")
         assert self.parser.chunks_as_text() == "foo bla\nbar"
@@ -205,6 +406,331 @@ class TestChunkHTMLParser:
             assert 'SHM Converge' not in list_chunks
 
 
+class TestChunkHTMLParserLimits:
+
+    html = "<html><body><h1>headline</h1><p>first paragraph</p><div><p>second</p><p>third</p></div></body></html>"
+
+    def test_no_limit_hit(self):
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+            parser = ChunkHTMLParser(parser_backend=parser_backend, max_input_length=len(self.html), max_nodes=7,
+                                     max_chars=36)
+            parser.parse(self.html)
+            assert len(parser.chunks) == 4
+            assert not parser.truncated
+
+    def test_max_input_length(self):
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+            parser = ChunkHTMLParser(parser_backend=parser_backend, max_input_length=self.html.index("</p>"))
+            parser.parse(self.html)
+            assert parser.chunks == [Chunk("headline", chunk_type=Chunk.headline_type), Chunk("first paragraph")]
+            assert parser.truncated
+
+    def test_max_input_length_of_bytes_does_not_split_characters(self):
+        html = "<html><body><p>Grüße aus München</p><p>Café</p></body></html>".encode('utf-8')
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_BACKEND, LXML_NATIVE_BACKEND]:
+            parser = ChunkHTMLParser(parser_backend=parser_backend, max_input_length=html.index(b"\xa9"))
+            chunking_result = parser.to_chunking_result(html)
+            assert chunking_result.chunks == [Chunk("Grüße aus München"), Chunk("Caf")]
+            assert chunking_result.truncated
+
+    def test_truncate_html(self):
+        assert truncate_html("Café", 3) == "Caf"
+        assert truncate_html("Café".encode('utf-8'), 4) == b"Caf"
+        assert truncate_html("Café".encode('utf-8'), 10) == "Café".encode('utf-8')
+        assert truncate_html("Café".encode('utf-16'), 7) == "Ca".encode('utf-16')
+        assert truncate_html("Café".encode('iso-8859-15'), 4, encoding_hint='iso-8859-15') == b"Caf\xe9"
+
+    def test_max_nodes(self):
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+            chunking_result = ChunkHTMLParser(parser_backend=parser_backend, max_nodes=3).to_chunking_result(self.html)
+            assert chunking_result.chunks == [Chunk("headline", chunk_type=Chunk.headline_type),
+                                              Chunk("first paragraph")]
+            assert chunking_result.truncated
+
+    def test_max_chars(self):
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+            parser = ChunkHTMLParser(parser_backend=parser_backend, max_chars=13)
+            chunking_result = parser.to_chunking_result(self.html)
+            assert chunking_result.chunks == [Chunk("headline", chunk_type=Chunk.headline_type), Chunk("first")]
+            assert chunking_result.truncated
+            assert parser.parse_spans(self.html).chunks_as_text() == "headline\nfirst"
+
+    def test_limits_in_batch(self):
+        results = list(Html2TextChunksConverter.iter_batch_text_chunks([self.html, "<body>foo</body>"], workers=1,
+                                                                        max_chars=10))
+        assert [result.truncated for result in results] == [True, False]
+
+
+class TestSharedChunkHTMLParser:
+
+    def test_to_chunks_does_not_change_parser_state(self):
+        parser = ChunkHTMLParser()
+        assert parser.to_chunks("<html><body><p>foo</p></body></html>") == [Chunk("foo")]
+        assert parser.chunks == []
+
+    def test_parser_can_be_shared_by_threads(self):
+        contents = []
+        for resource in RESOURCES:
+            with open(os.path.join(os.path.dirname(__file__), 'resources', resource)) as f:
+                contents.append(f.read())
+        for parser_backend in [HTML_PARSER_BACKEND, LXML_NATIVE_BACKEND]:
+            parser = ChunkHTMLParser(parser_backend=parser_backend)
+            expected_chunks = [parser.to_chunks(content) for content in contents]
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                assert list(executor.map(parser.to_chunks, contents * 4)) == expected_chunks * 4
+
+
+class TestStreamingChunkHTMLParser:
+
+    @staticmethod
+    def feed_in_parts(parser, html, part_length):
+        chunks = []
+        for start in range(0, len(html), part_length):
+            chunks.extend(parser.feed(html[start:start + part_length]))
+        return chunks + parser.close()
+
+    def test_chunks_are_returned_as_soon_as_they_are_closed(self):
+        parser = StreamingChunkHTMLParser()
+        assert parser.feed("<html><body><p>foo</p><p>ba") == [Chunk("foo")]
+        assert parser.feed("r</p><h1>baz") == [Chunk("bar")]
+        assert parser.close() == [Chunk("baz", chunk_type=Chunk.headline_type)]
+
+    def test_text_split_between_parts_is_joined(self):
+        assert self.feed_in_parts(StreamingChunkHTMLParser(), "<body><p>foo bar&nbsp;baz</p></body>", 3) \
+               == [Chunk("foo bar\xa0baz")]
+
+    def test_parser_can_be_reused_after_close(self):
+        parser = StreamingChunkHTMLParser()
+        assert self.feed_in_parts(parser, "<body>foo</body>", 4) == [Chunk("foo")]
+        assert self.feed_in_parts(parser, "<body>bar</body>", 4) == [Chunk("bar")]
+
+    def test_ignore_head_content_and_content_without_body(self):
+        assert self.feed_in_parts(StreamingChunkHTMLParser(), "<html><head><p>ignored</p></head><body><p>foo</p>"
+                                                              "</body></html>", 5) == [Chunk("foo")]
+        assert self.feed_in_parts(StreamingChunkHTMLParser(), "<html>foo</html>", 5) == []
+
+    def test_removed_tags_comments_and_declarations_are_ignored(self):
+        parser = StreamingChunkHTMLParser(custom_tags_to_remove=['nav'])
+        html = "<html><body><script>if (a </b) {}</script><nav><p>menu</nav><style>x</style><header>h</header>" \
+               "<p>foo<!-- comment -->bar</p><![CDATA[cdata]]><?pi?><footer><div>f</footer>baz</body></html>"
+        assert self.feed_in_parts(parser, html, 7) == [Chunk("foo bar"), Chunk("baz")]
+
+    def test_unmatched_end_tags_do_not_break_flow(self):
+        assert self.feed_in_parts(StreamingChunkHTMLParser(), "<body>foo<b>bar</b></br><b>baz</b></body>", 2) \
+               == [Chunk("foo bar baz")]
+
+    def test_min_chunk_length(self):
+        parser = StreamingChunkHTMLParser(min_chunk_length=3)
+        assert self.feed_in_parts(parser, "<html><body><i>A</i>L<br/><u>L</u>E<em><b>S  </b></html>", 3) \
+               == [Chunk("A L"), Chunk("L E S")]
+
+    def test_same_chunks_as_chunk_html_parser(self):
+        for resource in RESOURCES:
+            with open(os.path.join(os.path.dirname(__file__), 'resources', resource)) as f:
+                content = f.read()
+                expected_chunks = Html2TextChunksConverter.to_text_chunks(content)
+                assert self.feed_in_parts(StreamingChunkHTMLParser(), content, 1000) == expected_chunks
+                assert list(Html2TextChunksConverter.iter_text_chunks([content])) == expected_chunks
+
+
+class TestLxmlNativeChunkHTMLParser:
+
+    parser = ChunkHTMLParser(parser_backend=LXML_NATIVE_BACKEND)
+
+    def test_none_input(self):
+        self.parser.parse(None)
+        assert self.parser.chunks == []
+
+    def test_blank_input(self):
+        self.parser.parse(" ")
+        assert self.parser.chunks == []
+
+    def test_only_comment(self):
+        self.parser.parse("<!-- comment -->")
+        assert self.parser.chunks == []
+
+    def test_xml_declaration(self):
+        self.parser.parse("<?xml version='1.0' encoding='utf-8'?><html><body><p>foo</p></body></html>")
+        assert self.parser.chunks == [Chunk("foo")]
+
+    def test_text_around_nested_tags(self):
+        self.parser.parse("<body>ba<u>bu</u><p>foo<p><b><a>bar</a></b><span class=\"schnu\"><b><i>baz</i></b><font>"
+                          "<em>wicked</em></font>faz<abbr>a<sup>b</sup></abbr></span></body>")
+        assert self.parser.chunks == [Chunk("ba bu"), Chunk("foo"), Chunk("bar baz wicked faz a b")]
+
+    def test_text_after_removed_tags_and_comments_is_kept(self):
+        self.parser.parse("<html><body><p>foo<script>x</script>bar<!-- comment -->baz</p><header>ignore</header>"
+                          "<style>x</style>bla</body></html>")
+        assert self.parser.chunks == [Chunk("foo bar baz"), Chunk("bla")]
+
+    def test_custom_tags_are_removed(self):
+        parser = ChunkHTMLParser(custom_tags_to_remove=['nav'], parser_backend=LXML_NATIVE_BACKEND)
+        parser.parse("<html><body><nav><p>menu</p></nav><p>foo</p></body></html>")
+        assert parser.chunks == [Chunk("foo")]
+
+    def test_get_chunk_type(self):
+        self.parser.parse("<html><body><div>a div</div><li>a li</li><h1><a>a h1</a></h1><h3>a h3</h3></body></html>")
+        assert self.parser.chunks == [Chunk('a div', chunk_type=None), Chunk('a li', chunk_type='list'),
+                                      Chunk('a h1', chunk_type='headline'), Chunk('a h3', chunk_type='headline')]
+
+    def test_ignore_result_chunks_if_too_short(self):
+        parser = ChunkHTMLParser(min_chunk_length=3, parser_backend=LXML_NATIVE_BACKEND)
+        parser.parse("<html><body><i>A</i>L<br/><u>L</u>E<em><b>S  </b></html>")
+        assert parser.chunks == [Chunk("A L"), Chunk("L E S")]
+
+
+class TestChunk:
+
+    def test_added_data_is_joined_with_spaces(self):
+        chunk = Chunk("foo")
+        chunk.add_data("bar")
+        chunk.add_data("baz")
+        assert chunk.data == "foo bar baz"
+        chunk.add_data("bla")
+        assert chunk.data == "foo bar baz bla"
+        assert chunk == Chunk("foo bar baz bla")
+
+    def test_data_can_be_set(self):
+        chunk = Chunk("foo")
+        chunk.add_data("bar")
+        chunk.data = "baz"
+        assert chunk.data == "baz"
+
+    def test_repr(self):
+        chunk = Chunk("foo", chunk_type=Chunk.headline_type)
+        chunk.add_data("bar")
+        assert repr(chunk) == str(chunk) == "{'data': 'foo bar', 'chunk_type': 'headline'}"
+
+    def test_equality(self):
+        assert Chunk("foo") == Chunk("foo")
+        assert Chunk("foo") != Chunk("foo", chunk_type=Chunk.list_type)
+        assert Chunk("foo") != "foo"
+
+    def test_chunk_has_no_instance_dict(self):
+        assert not hasattr(Chunk("foo"), '__dict__')
+
+    def test_chunk_can_be_pickled(self):
+        chunk = Chunk("foo", chunk_type=Chunk.list_type)
+        chunk.add_data("bar")
+        assert pickle.loads(pickle.dumps(chunk)) == Chunk("foo bar", chunk_type=Chunk.list_type)
+
+
+class TestChunkSpans:
+
+    def test_spans_equal_chunks(self):
+        for resource in RESOURCES:
+            with open(os.path.join(os.path.dirname(__file__), 'resources', resource)) as f:
+                content = f.read()
+                parser = ChunkHTMLParser(parser_backend=LXML_NATIVE_BACKEND)
+                parser.parse(content)
+                chunk_spans = Html2TextChunksConverter.to_chunk_spans(content, parser_backend=LXML_NATIVE_BACKEND)
+                assert chunk_spans.to_chunks() == parser.chunks
+                assert chunk_spans.chunks_as_text() == parser.chunks_as_text()
+
+    def test_spans_are_offsets_into_text(self):
+        chunk_spans = ChunkHTMLParser().parse_spans("<html><body><h1>a <b>h1</b></h1><p>foo</p><li>a li</li></body>"
+                                                    "</html>")
+        assert chunk_spans.text == "a h1\nfoo\na li"
+        assert [chunk_spans.span(i) for i in range(len(chunk_spans))] \
+               == [(0, 4, Chunk.headline_type), (5, 8, None), (9, 13, Chunk.list_type)]
+        assert chunk_spans[-1] == Chunk("a li", chunk_type=Chunk.list_type)
+        assert chunk_spans[1:] == [Chunk("foo"), Chunk("a li", chunk_type=Chunk.list_type)]
+        with pytest.raises(IndexError):
+            chunk_spans.span(3)
+
+    def test_short_chunks_are_ignored(self):
+        chunk_spans = ChunkHTMLParser(min_chunk_length=3).parse_spans("<html><body><p>A</p><p>foo</p></body></html>")
+        assert chunk_spans.to_chunks() == [Chunk("foo")]
+        assert chunk_spans.chunks_as_text() == "foo"
+
+    def test_blank_input(self):
+        chunk_spans = ChunkHTMLParser().parse_spans(" ")
+        assert len(chunk_spans) == 0
+        assert chunk_spans.chunks_as_text() == ""
+
+    def test_spans_can_be_pickled(self):
+        chunk_spans = ChunkHTMLParser().parse_spans("<html><body><h1>foo</h1>bar</body></html>")
+        assert pickle.loads(pickle.dumps(chunk_spans)).to_chunks() == chunk_spans.to_chunks()
+
+
+class TestBoilerplateIndex:
+
+    def test_chunks_on_most_pages_of_a_host_are_boilerplate(self):
+        index = BoilerplateIndex(max_page_fraction=0.5, min_pages=2)
+        menu = Chunk("Home Products About")
+        assert index.filter("http://foo.de/1", [menu, Chunk("first")]) == [menu, Chunk("first")]
+        assert index.filter("http://foo.de/2", [menu, Chunk("second")]) == [Chunk("second")]
+        assert index.filter("http://foo.de/3", [menu, menu, Chunk("third")]) == [Chunk("third")]
+        assert not index.is_boilerplate("http://foo.de/", Chunk("first"))
+        assert not index.is_boilerplate("http://foo.de/", Chunk("Home Products About", chunk_type=Chunk.list_type))
+        assert not index.is_boilerplate("http://bar.de/", menu)
+
+    def test_least_recently_seen_chunks_and_hosts_are_forgotten(self):
+        index = BoilerplateIndex(min_pages=1, max_chunks_per_host=2, max_hosts=2)
+        index.add_page("http://foo.de/", [Chunk("a"), Chunk("b")])
+        index.add_page("http://foo.de/", [Chunk("b"), Chunk("c")])
+        assert not index.is_boilerplate("http://foo.de/", Chunk("a"))
+        assert index.is_boilerplate("http://foo.de/", Chunk("b"))
+        index.add_page("http://bar.de/", [Chunk("a")])
+        index.add_page("http://baz.de/", [Chunk("a")])
+        assert not index.is_boilerplate("http://foo.de/", Chunk("b"))
+        assert index.is_boilerplate("http://baz.de/", Chunk("a"))
+
+    def test_pages_without_host_are_not_filtered(self):
+        index = BoilerplateIndex(min_pages=1)
+        chunks = [Chunk("Home Products About", chunk_type=Chunk.list_type)]
+        for source_url in [None, "http://foo.de/", None, "about:blank", None]:
+            index.add_page(source_url, chunks)
+        assert index.filter(None, chunks) == chunks
+        assert index.filter("about:blank", chunks) == chunks
+        assert not index.is_boilerplate(None, chunks[0])
+        assert index.filter("http://foo.de/", chunks) == []
+
+    def test_to_text_chunks_with_boilerplate_index(self):
+        index = BoilerplateIndex(min_pages=2)
+        html = "<html><body><nav><a>Home</a> <a>About</a></nav><p>%s</p></body></html>"
+        Html2TextChunksConverter.to_text_chunks(html % "foo", boilerplate_index=index, source_url="https://foo.de/a")
+        assert Html2TextChunksConverter.to_text_chunks(html % "bar", boilerplate_index=index,
+                                                       source_url="https://foo.de/b") == [Chunk("bar")]
+
+
+class TestRemovalRules:
+
+    def test_tag_names(self):
+        rules = RemovalRules(['script', 'oev-footer'])
+        assert rules.matches('script', {})
+        assert rules.matches('oev-footer', {'class': 'foo'})
+        assert not rules.matches('div', {})
+
+    def test_class_and_id_selectors(self):
+        rules = RemovalRules(['div.banner.cookie', '#nav'])
+        assert rules.matches('div', {'class': 'cookie banner'})
+        assert rules.matches('div', {'class': ['banner', 'cookie', 'x']})
+        assert not rules.matches('div', {'class': 'banner'})
+        assert not rules.matches('span', {'class': 'cookie banner'})
+        assert rules.matches('ul', {'id': 'nav'})
+        assert not rules.matches('ul', {'id': 'navigation'})
+
+    def test_attribute_selectors(self):
+        rules = RemovalRules(['[aria-hidden]', 'a[href*="ads."]', "[role='banner']"])
+        assert rules.matches('div', {'aria-hidden': 'true'})
+        assert rules.matches('a', {'href': 'http://ads.foo.de'})
+        assert not rules.matches('img', {'href': 'http://ads.foo.de'})
+        assert rules.matches('div', {'role': 'banner'})
+        assert not rules.matches('div', {'role': 'main'})
+
+    def test_invalid_selector(self):
+        with pytest.raises(ValueError):
+            RemovalRules(['div > p'])
+        with pytest.raises(ValueError):
+            RemovalRules([''])
+
+    def test_rules_are_compiled_once(self):
+        assert RemovalRules.compile(('script', '.ad')) is RemovalRules.compile(('script', '.ad'))
+        assert ChunkHTMLParser(custom_tags_to_remove=['nav']).removal_rules \
+               is ChunkHTMLParser(custom_tags_to_remove=['nav']).removal_rules
+
+
 class TestHTMLParser:
     html_parser = HTMLParser()
 
@@ -222,3 +748,8 @@ class TestHTMLParser:
         assert (self.html_parser.to_text(
             "<html><body><p>foo</p><div class=foo><span>Bär</span></div></body></html>",
             text_separator=" ")) == "foo Bär"
+
+    def test_to_text_with_lxml_backend(self):
+        assert HTMLParser(parser_backend=LXML_BACKEND).to_text(
+            "<html><body><p>foo</p><script>bar</script><div class=foo><span>Bär</span></div></body></html>") \
+               == "foo\nBär"
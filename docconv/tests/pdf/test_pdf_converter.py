@@ -1,9 +1,14 @@
+import io
+import mmap
 import os
 import datetime
+import pathlib
+import types
 
 import pytest
-from pdf import Pdf2TextConverter
-from pdf import PdfConversionError
+from docconv.htmlchunks import ArticleDetector
+from docconv.pdf import Pdf2TextConverter
+from docconv.pdf import PdfConversionError, PdfConversionPool, PdfWorkerError
 
 pdf2_text_converter = Pdf2TextConverter()
 
@@ -49,7 +54,254 @@ Medicare beneficiaries. For example""" in text_result.text
         assert text_result.text.endswith("President, Society of Hospital Medicine")
 
 
+def test_pdf_to_text_can_be_called_on_the_class():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'test.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        assert Pdf2TextConverter.to_text(content).text == pdf2_text_converter.to_text(content).text
+
+
 def test_pdf_errors_are_caught():
         with pytest.raises(PdfConversionError) as ex:
             pdf2_text_converter.to_text("not bytes")
-        assert str(ex.value) == 'Error occurred while loading pdf document (TypeError)'
\ No newline at end of file
+        assert str(ex.value) == 'Error occurred while loading pdf document (TypeError)'
+
+def test_pdf_pages_are_iterated():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        pages = list(pdf2_text_converter.iter_pages(content))
+        assert [page.page_number for page in pages] == list(range(1, len(pages) + 1))
+        assert len(pages) > 1
+        assert pages[0].text.startswith("October 5, 2020")
+        assert all(page.char_count == len(page.text) for page in pages)
+        assert "\n\n".join(page.text for page in pages).strip() == pdf2_text_converter.to_text(content).text
+
+
+def test_pdf_text_is_written_to_output():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        output = io.StringIO()
+        text_result = pdf2_text_converter.to_text(content, output=output)
+        assert text_result.text is None
+        assert text_result.author == 'Lisa Zoks'
+        assert output.getvalue() == pdf2_text_converter.to_text(content).text
+
+
+def test_pdf_iteration_errors_are_caught():
+    with pytest.raises(PdfConversionError) as ex:
+        next(pdf2_text_converter.iter_pages("not bytes"))
+    assert str(ex.value) == 'Error occurred while loading pdf document (TypeError)'
+
+
+def test_pdf_pages_are_extracted_in_parallel_in_order():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        parallel_converter = Pdf2TextConverter(parallel_workers=2, min_pages_for_parallel=1)
+        parallel_pages = list(parallel_converter.iter_pages(content))
+        assert [page.page_number for page in parallel_pages] == list(range(1, len(parallel_pages) + 1))
+        assert parallel_converter.to_text(content).text == pdf2_text_converter.to_text(content).text
+
+
+def test_page_range_is_split_evenly():
+    assert Pdf2TextConverter._split_page_range(0, 10, 4) == [(0, 3), (3, 6), (6, 8), (8, 10)]
+    assert Pdf2TextConverter._split_page_range(0, 2, 4) == [(0, 1), (1, 2)]
+    assert Pdf2TextConverter._split_page_range(5, 9, 2) == [(5, 7), (7, 9)]
+
+
+def test_pdf_from_path():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'test.pdf')
+    with open(pdf, "rb") as f:
+        expected_text = pdf2_text_converter.to_text(f.read()).text
+    text_result = pdf2_text_converter.to_text(pathlib.Path(pdf))
+    assert text_result.author == 'BMC - ITS'
+    assert text_result.text == expected_text
+
+
+def test_pdf_from_memory_map():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'test.pdf')
+    with open(pdf, "rb") as f:
+        expected_text = pdf2_text_converter.to_text(f.read()).text
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as pdf_map:
+            assert pdf2_text_converter.to_text(pdf_map).text == expected_text
+            with memoryview(pdf_map) as pdf_view:
+                assert pdf2_text_converter.to_text(pdf_view).text == expected_text
+
+
+def test_pdf_path_errors_are_caught():
+    with pytest.raises(PdfConversionError) as ex:
+        pdf2_text_converter.to_text(pathlib.Path(os.path.dirname(__file__), 'resources', 'missing.pdf'))
+    assert str(ex.value) == 'Error occurred while loading pdf document (ValueError)'
+
+
+def test_pdf_is_not_truncated_without_limits():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        assert not pdf2_text_converter.to_text(f.read()).truncated
+
+
+def test_pdf_page_range():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        pages = list(pdf2_text_converter.iter_pages(content))
+        text_result = Pdf2TextConverter(first_page=2, last_page=3).to_text(content)
+        assert text_result.truncated
+        assert text_result.text == "\n\n".join(page.text for page in pages[1:3]).strip()
+        assert [page.page_number for page in Pdf2TextConverter(first_page=2, last_page=3).iter_pages(content)] == [2, 3]
+
+
+def test_pdf_max_pages():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        text_result = Pdf2TextConverter(max_pages=1).to_text(content)
+        assert text_result.truncated
+        assert text_result.text == next(pdf2_text_converter.iter_pages(content)).text.strip()
+        assert Pdf2TextConverter(max_pages=1000).to_text(content).truncated is False
+
+
+def test_pdf_max_chars():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        full_text = pdf2_text_converter.to_text(content).text
+        text_result = Pdf2TextConverter(max_chars=100).to_text(content)
+        assert text_result.truncated
+        assert text_result.text == full_text[:100]
+        text_result = Pdf2TextConverter(max_chars=len(full_text)).to_text(content)
+        assert not text_result.truncated
+        assert text_result.text == full_text
+
+
+def test_pdf_metadata():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'test_with_title.pdf')
+    with open(pdf, "rb") as f:
+        metadata = pdf2_text_converter.metadata(f.read())
+        assert metadata.author == 'BMC - ITS'
+        assert metadata.creation_date == datetime.datetime(2009, 11, 9, 16, 3, 25)
+        assert metadata.title == 'Patient PASS'
+        assert not metadata.is_encrypted
+        assert metadata.page_count == len(metadata.page_sizes)
+        assert all(width > 0 and height > 0 for width, height in metadata.page_sizes)
+
+
+def test_pdf_metadata_page_count():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        assert pdf2_text_converter.metadata(content).page_count == len(list(pdf2_text_converter.iter_pages(content)))
+
+
+def test_pdf_metadata_errors_are_caught():
+    with pytest.raises(PdfConversionError) as ex:
+        pdf2_text_converter.metadata("not bytes")
+    assert str(ex.value) == 'Error occurred while loading pdf document (TypeError)'
+
+
+def test_pdf_conversion_pool():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'test.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        with PdfConversionPool(workers=1, max_documents_per_worker=1) as pool:
+            for _ in range(3):
+                text_result = pool.to_text(content)
+                assert text_result.author == 'BMC - ITS'
+                assert text_result.text == pdf2_text_converter.to_text(content).text
+
+
+def test_pdf_conversion_pool_timeout():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with PdfConversionPool(workers=1, timeout=0) as pool:
+        with pytest.raises(PdfWorkerError) as ex:
+            pool.to_text(pathlib.Path(pdf))
+        assert str(ex.value) == 'Pdf conversion timed out after 0 seconds'
+        pool.timeout = 60
+        assert pool.to_text(pathlib.Path(pdf)).author == 'Lisa Zoks'
+
+
+def test_pdf_conversion_pool_errors_are_passed_on():
+    with PdfConversionPool(workers=1) as pool:
+        with pytest.raises(PdfConversionError) as ex:
+            pool.to_text("not bytes")
+        assert type(ex.value) is PdfConversionError
+        assert str(ex.value) == 'Error occurred while loading pdf document (TypeError)'
+
+
+def test_pdf_with_text_layer_is_not_detected_as_scan():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        text_result = Pdf2TextConverter(scan_probe_pages=3).to_text(content)
+        assert not text_result.is_scanned
+        assert text_result.text == pdf2_text_converter.to_text(content).text
+        assert not pdf2_text_converter.is_scanned(content)
+
+
+def test_pdf_without_enough_text_is_detected_as_scan():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        text_result = Pdf2TextConverter(scan_probe_pages=3, min_chars_per_text_page=100000).to_text(f.read())
+        assert text_result.is_scanned
+        assert text_result.text == ""
+        assert text_result.author == 'Lisa Zoks'
+
+
+def test_pdf_with_empty_page_range_is_not_detected_as_scan():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        converter = Pdf2TextConverter(first_page=1000, scan_probe_pages=3)
+        text_result = converter.to_text(content)
+        assert not text_result.is_scanned
+        assert text_result.text == ""
+        assert text_result.truncated
+        assert not converter.is_scanned(content)
+
+
+def test_probe_pages_are_spread_over_page_range():
+    assert Pdf2TextConverter._get_probe_page_indexes(0, 10, 3) == [0, 3, 6]
+    assert Pdf2TextConverter._get_probe_page_indexes(4, 6, 3) == [4, 5]
+
+
+def test_pdf_compact_layout_collapses_padding():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'test.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        text_result = Pdf2TextConverter(layout_mode=Pdf2TextConverter.COMPACT_LAYOUT).to_text(content)
+        assert text_result.text.startswith("The 8P")
+        assert "Problems with medications □ Medication specific" in text_result.text
+        assert "  " not in text_result.text
+        assert "\n\n\n" not in text_result.text
+        assert len(text_result.text) < len(pdf2_text_converter.to_text(content).text)
+
+
+def test_pdf_raw_order_layout():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        text_result = Pdf2TextConverter(layout_mode=Pdf2TextConverter.RAW_ORDER_LAYOUT).to_text(f.read())
+        assert "Dear Administrator Verma," in text_result.text
+        assert "President, Society of Hospital Medicine" in text_result.text
+
+
+def test_pdf_chunks():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        chunks = pdf2_text_converter.iter_chunks(content)
+        assert isinstance(chunks, types.GeneratorType)
+        chunks = list(chunks)
+        assert chunks[0].data.startswith("October 5, 2020")
+        assert any(chunk.data.startswith("Dear Administrator Verma,") for chunk in chunks)
+        assert all(chunk.data == chunk.data.strip() and chunk.data for chunk in chunks)
+        assert ArticleDetector().is_article(chunks)
+
+
+def test_pdf_chunks_respect_page_range():
+    pdf = os.path.join(os.path.dirname(__file__), 'resources', 'multi_page.pdf')
+    with open(pdf, "rb") as f:
+        content = f.read()
+        assert len(list(Pdf2TextConverter(max_pages=1).iter_chunks(content))) < \
+               len(list(pdf2_text_converter.iter_chunks(content)))
@@ -12,7 +12,8 @@ setuptools.setup(
         'python-poppler==0.3.0',
         'BeautifulSoup4',
         'newspaper3k',
-        'regex'
+        'regex',
+        'lxml'
     ],
     tests_require=['pytest'],
 )